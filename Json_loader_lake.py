@@ -14,7 +14,7 @@ def mercator_projection(lon, lat):
 
 # Load the shapefile
 gdf = gpd.read_file("data/high_quality/physical/ne_10m_lakes")
-READ_DATA = ["name_en", "geometry"]
+READ_DATA = ["name_en", "geometry", "scalerank"]
 print(gdf.columns)
 print(gdf.values)
 print(gdf.head())
@@ -43,6 +43,7 @@ def preprocess_map_data(map_data):
 
 # Convert the GeoDataFrame to a dictionary
 data_dict = {}
+scaleranks = {}
 for _, row in gdf.iterrows():
     lake_name = row["lake"]
     geometry = row["geometry"]
@@ -58,8 +59,13 @@ for _, row in gdf.iterrows():
     data_dict[lake_name] = {
         "geometry": polygons
     }
+    scaleranks[lake_name] = int(row["scalerank"])
 preprocess_map_data(data_dict)
 
+# added after preprocess_map_data, it treats every key of a lake as a list of polygons
+for lake_name, scalerank in scaleranks.items():
+    data_dict[lake_name]["scalerank"] = scalerank  # turned into min_scale by map_layer.part_min_scale
+
 # Save the dictionary to a JSON file
 with open(f"maps/High_quality/lakes.json", "w") as json_file:
     json.dump(data_dict, json_file, indent=4)
@@ -14,8 +14,8 @@ def mercator_projection(lon, lat):
 
 # Load the shapefile
 gdf = gpd.read_file("data/high_quality/physical/ne_10m_rivers_lake_centerlines")
-gdf = gdf.dissolve(by="name_en").reset_index()
-READ_DATA = ["name_en", "geometry"]
+gdf = gdf.dissolve(by="name_en", aggfunc={"scalerank": "min"}).reset_index()  # most important piece counts
+READ_DATA = ["name_en", "geometry", "scalerank"]
 print(gdf.head())  # View the first five rows
 print(gdf.columns)
 # Select the relevant columns
@@ -61,7 +61,8 @@ for _, row in gdf.iterrows():
         exit()
 
     data_dict[country_name] = {
-        "geometry": points
+        "geometry": points,
+        "scalerank": int(row["scalerank"])  # turned into min_scale by map_layer.part_min_scale
     }
 preprocess_map_data(data_dict)
 print(data_dict)
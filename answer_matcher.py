@@ -0,0 +1,267 @@
+import json
+import os
+import unicodedata
+
+
+def normalize(text):
+    """
+    Normalize a name for comparing answers.
+    Removes diacritics ("Česko" -> "cesko"), case, punctuation and repeated spaces.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold()
+    text = "".join(c if c.isalnum() else " " for c in text)
+    return " ".join(text.split())
+
+
+def levenshtein(a, b):
+    """
+    Levenshtein distance of two strings, bit-parallel (Myers/Hyyrö) so one comparison
+    costs a few integer operations per character. Used as the metric of the BK-tree.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+
+    masks = {}
+    for i, c in enumerate(a):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    plus, minus = full, 0
+    score = len(a)
+    for c in b:
+        eq = masks.get(c, 0)
+        xv = eq | minus
+        xh = (((eq & plus) + plus) ^ plus) | eq
+        horizontal_plus = (minus | ~(xh | plus)) & full
+        horizontal_minus = plus & xh
+        if horizontal_plus & last:
+            score += 1
+        elif horizontal_minus & last:
+            score -= 1
+        horizontal_plus = ((horizontal_plus << 1) | 1) & full
+        horizontal_minus = (horizontal_minus << 1) & full
+        plus = (horizontal_minus | ~(xv | horizontal_plus)) & full
+        minus = horizontal_plus & xv
+    return score
+
+
+def edit_distance(a, b, limit=None):
+    """
+    Damerau-Levenshtein distance (optimal string alignment) of two strings.
+    If limit is given the computation stops early and returns limit + 1 once the distance is surely bigger.
+    """
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        ca = a[i - 1]
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cb = b[j - 1]
+            cost = 0 if ca == cb else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:  # swapped letters
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if limit is not None and row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over normalized names, distances are Levenshtein.
+    search() only visits children whose edge distance is within k of the query distance,
+    so looking for close names does not compare against the whole catalog.
+    """
+
+    def __init__(self, words=()):
+        self.root = None  # node = [word, {distance: child node}]
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, word):
+        if self.root is None:
+            self.root = [word, {}]
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return  # already in the tree
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, k):
+        """Return list of (distance, word) of all words within distance k, sorted by distance."""
+        found = []
+        if self.root is None:
+            return found
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = levenshtein(word, node[0])
+            if distance <= k:
+                found.append((distance, node[0]))
+            for edge, child in node[1].items():
+                if distance - k <= edge <= distance + k:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+class AnswerMatcher:
+    """
+    Grades typed answers against the term catalog (maps/terms.json).
+
+    Every term and its aliases (maps/aliases.json, e.g. Czech names) are normalized once and
+    kept in a dict for exact lookups and in a BK-tree for "closest term within distance k".
+    Typos are counted with edit_distance, so swapped letters cost 1.
+    The tree is only built when the first answer is not an exact match.
+    """
+
+    def __init__(self, terms, aliases=None):
+        self.forms = {}  # normalized form -> set of term names
+        self.term_forms = {}  # term name -> set of normalized forms
+        self.bk_tree = None
+
+        for layer, names in terms.items():
+            for name in names:
+                self.add_term(name)
+
+        if aliases:
+            for layer, alias_map in aliases.items():
+                for name, alias_list in alias_map.items():
+                    for alias in alias_list:
+                        self.add_term(name, alias)
+
+    @classmethod
+    def from_files(cls, terms_path="maps/terms.json", aliases_path="maps/aliases.json"):
+        with open(terms_path, "r") as f:
+            terms = json.load(f)
+        aliases = None
+        if os.path.exists(aliases_path):
+            with open(aliases_path, "r", encoding="utf-8") as f:
+                aliases = json.load(f)
+        return cls(terms, aliases)
+
+    def add_term(self, name, alias=None):
+        """Index a term name (or one of its aliases)."""
+        form = normalize(alias if alias is not None else name)
+        if not form:
+            return
+        self.forms.setdefault(form, set()).add(name)
+        self.term_forms.setdefault(name, set()).add(form)
+        if self.bk_tree is not None:
+            self.bk_tree.add(form)
+
+    @property
+    def tree(self):
+        if self.bk_tree is None:
+            self.bk_tree = BKTree(self.forms)
+        return self.bk_tree
+
+    def search(self, form, k):
+        """
+        Return sorted (distance, form) pairs within edit distance k.
+        The tree is searched with k + 1, one swapped pair costs 2 in Levenshtein but 1 here.
+        """
+        if k <= 0:
+            return [(0, form)] if form in self.forms else []
+        found = []
+        for _, other in self.tree.search(form, k + 1):
+            distance = edit_distance(form, other, k)
+            if distance <= k:
+                found.append((distance, other))
+        found.sort()
+        return found
+
+    @staticmethod
+    def tolerance(form):
+        """How many typos are forgiven, short names have to be exact."""
+        if len(form) <= 3:
+            return 0
+        if len(form) <= 7:
+            return 1
+        return 2
+
+    def closest(self, text, k=None):
+        """
+        Return (term name, distance) of the term closest to text within distance k
+        (default: tolerance of the text), None if there is none.
+        """
+        form = normalize(text)
+        if not form:
+            return None
+        if form in self.forms:
+            return sorted(self.forms[form])[0], 0
+        if k is None:
+            k = self.tolerance(form)
+        found = self.search(form, k)
+        if not found:
+            return None
+        distance, best = found[0]
+        return sorted(self.forms[best])[0], distance
+
+    def is_correct(self, text, expected):
+        """True if text names the expected term, ignoring diacritics, case and small typos."""
+        form = normalize(text)
+        if not form:
+            return False
+        targets = self.term_forms.get(expected, set()) | {normalize(expected)}
+        if form in targets:
+            return True
+
+        k = self.tolerance(form)
+        distance = min(edit_distance(form, target, k) for target in targets)
+        if distance > k:
+            return False
+
+        # a typo is only forgiven if no other term fits the answer better
+        for other_distance, other in self.search(form, distance - 1):
+            if expected not in self.forms[other]:
+                return False
+        return True
+
+    def suggestion(self, text):
+        """Name for a "did you mean" hint, None if nothing is close enough."""
+        found = self.closest(text)
+        if found is None or found[1] == 0:
+            return None
+        return found[0]
+
+
+answer_matcher = None
+
+
+def get_answer_matcher():
+    """Return the shared matcher, it is built on first use and then reused by every quiz."""
+    global answer_matcher
+    if answer_matcher is None:
+        answer_matcher = AnswerMatcher.from_files()
+    return answer_matcher
@@ -0,0 +1,25 @@
+"""
+Region of a learning set, used to frame a quiz on it.
+The bboxes of the terms come from the term catalog (see term_catalog.py).
+"""
+from term_catalog import term_bbox, term_info
+
+
+def items_bbox(items, fallback=None):
+    """
+    Union bbox of the items of a learning set ({key: [names]}), None if none is known.
+    fallback(key, name) is asked for terms missing in the catalog (bbox or None).
+    """
+    boxes = []
+    for key, names in items.items():
+        for name in names:
+            info = term_info(key, name)
+            bbox = None if info is None else term_bbox(info)
+            if bbox is None and fallback is not None:
+                bbox = fallback(key, name)
+            if bbox is not None:
+                boxes.append(bbox)
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
@@ -0,0 +1,188 @@
+"""
+Micro benchmarks of the geometry primitives on real rings from the shipped map files.
+
+    python benchmarks/bench_geometry.py            # time, count allocations, check against the references
+    python benchmarks/bench_geometry.py --update   # store the current results as the new references
+
+Cases are the smallest, median and largest country ring of Low_quality/polygons.json and the
+longest rivers of Medium_quality/rivers.json, projected so part of them is off screen.
+Every primitive is reported in ns per vertex (per call for box_overlap_percent) and in
+allocations (tracemalloc peak KB of one call). Results are compared with
+benchmarks/reference/geometry.json, so a faster version has to return the same answers.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from frame_preparer import View, scale_coords  # noqa: E402
+from geometry import (box_overlap_percent, circle_point_collision, circle_polygon_collision,  # noqa: E402
+                      circle_polyline_collision, clip_polygon_to_screen)
+from loop_managers import preprocess_map_data  # noqa: E402
+from map_layer import MapLayer  # noqa: E402
+
+REFERENCE_PATH = "benchmarks/reference/geometry.json"
+SCREEN = (1280, 720)
+MIN_RUN = 0.07  # seconds of one timing run
+
+
+def load_function(path, name):
+    """Take one function out of a script without running the script (the Json_loader_* ones need geopandas)."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    module = ast.Module(body=[node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == name], type_ignores=[])
+    namespace = {}
+    exec(compile(module, path, "exec"), namespace)
+    return namespace[name]
+
+
+preprocess_loader_data = load_function("Json_loader_lake.py", "preprocess_map_data")
+
+
+def load_cases():
+    """[(case name, ring as list of map points)] picked by vertex count, so they are stable."""
+    with open("maps/Low_quality/polygons.json", "r") as f:
+        countries = MapLayer.from_dict("polygons", json.load(f))
+    with open("maps/Medium_quality/rivers.json", "r") as f:
+        rivers = MapLayer.from_dict("lines", json.load(f))
+    rings = sorted((len(countries.part_coords(part)) // 2, countries.part_name(part), part) for part in range(countries.part_count()))
+    rings = [ring for ring in rings if ring[0] >= 4]
+    cases = []
+    for label, (count, name, part) in (("small", rings[0]), ("median", rings[len(rings) // 2]), ("largest", rings[-1])):
+        cases.append((f"{label} country ({name}, {count})", "polygon", countries.part_points(part)))
+    lines = sorted((len(rivers.part_coords(part)) // 2, rivers.part_name(part), part) for part in range(rivers.part_count()))
+    for count, name, part in lines[-2:]:
+        cases.append((f"long river ({name}, {count})", "line", rivers.part_points(part)))
+    return cases
+
+
+def project(points):
+    """Screen points with the shape filling twice the screen around its centre, so clipping has work."""
+    xs = [x for x, y in points]
+    ys = [y for x, y in points]
+    width, height = max(max(xs) - min(xs), 1e-6), max(max(ys) - min(ys), 1e-6)
+    scale = 2 * min(SCREEN[0] / width, SCREEN[1] / height)
+    center_x, center_y = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+    view = View(0, scale, SCREEN[0] / 2 - center_x * scale, SCREEN[1] / 2 + center_y * scale, *SCREEN)
+    return scale_coords(array("d", [value for point in points for value in point]), view)
+
+
+def digest(points):
+    """Short hash of a point list rounded to 1e-6, clipped polygons are compared by it."""
+    text = ";".join(f"{x:.6f},{y:.6f}" for x, y in points)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def measure(function):
+    """Seconds per call (best of 3 runs of at least MIN_RUN) and bytes allocated at the peak of one call."""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_RUN:
+            break
+        calls *= 2
+    best = elapsed
+    for _ in range(2):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best / calls, peak
+
+
+def benchmarks(cases):
+    """Yield (case, primitive, vertices, function) of every measurement."""
+    for case, kind, points in cases:
+        screen = project(points)
+        xs = [x for x, y in screen]
+        ys = [y for x, y in screen]
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+        probe = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        vertices = len(screen)
+        if kind == "polygon":
+            yield case, "clip_polygon_to_screen", vertices, lambda screen=screen: digest(clip_polygon_to_screen(screen, *SCREEN, margin=10))
+            yield case, "circle_polygon_collision", vertices, lambda screen=screen, probe=probe: circle_polygon_collision(probe, 10, screen)
+        else:
+            yield case, "circle_polyline_collision", vertices, lambda screen=screen, probe=probe: circle_polyline_collision(probe, 10, screen)
+        yield case, "box_overlap_percent", 1, lambda bbox=bbox: round(box_overlap_percent((0, 0, *SCREEN), bbox, relative_to="B"), 9)
+        yield case, "circle_point_collision", len(screen[:64]), lambda screen=screen: sum(circle_point_collision(screen[0], 10, point) for point in screen[:64])
+
+        # the term creator variant (one feature) and the Json_loader_* one (a whole file)
+        feature = {"geometry": points}
+        yield case, "preprocess_map_data (term creator)", vertices, lambda feature=feature: run_term_creator(feature)
+        data = {"term": {"geometry": [points]}}
+        yield case, "preprocess_map_data (Json_loader)", vertices, lambda data=data: run_loader(data)
+
+
+def run_term_creator(feature):
+    """preprocess_map_data of the term creator on a copy of the feature, returns the bbox."""
+    copy_of = dict(feature)
+    preprocess_map_data(copy_of)
+    return list(copy_of["geometry"][0]["bbox"])
+
+
+def run_loader(data):
+    """preprocess_map_data of the Json_loader_* scripts on a copy of the data, returns the bboxes."""
+    copy_of = {name: dict(value) for name, value in data.items()}
+    preprocess_loader_data(copy_of)
+    return [list(polygon["bbox"]) for polygon in copy_of["term"]["geometry"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--update", action="store_true", help="store the results as the new references")
+    args = parser.parse_args()
+
+    references = {}
+    if os.path.exists(REFERENCE_PATH) and not args.update:
+        with open(REFERENCE_PATH, "r") as f:
+            references = json.load(f)
+    results = {}
+    mismatches = 0
+    cases = load_cases()
+    width = max(len(case) for case, kind, points in cases)
+    print(f"{'case':<{width}} {'primitive':<34} {'ns/vertex':>10} {'peak KB':>8}  check")
+    for case, primitive, vertices, function in benchmarks(cases):
+        result = function()
+        seconds, peak = measure(function)
+        name = f"{case} / {primitive}"
+        results[name] = result
+        if args.update:
+            check = "stored"
+        elif name not in references:
+            check = "no reference"
+        elif references[name] == json.loads(json.dumps(result)):
+            check = "ok"
+        else:
+            check = "MISMATCH"
+            mismatches += 1
+        print(f"{case:<{width}} {primitive:<34} {seconds * 1e9 / vertices:>10.1f} {peak / 1024:>8.1f}  {check}")
+
+    if args.update:
+        os.makedirs(os.path.dirname(REFERENCE_PATH), exist_ok=True)
+        with open(REFERENCE_PATH, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if mismatches:
+        print(f"{mismatches} results differ from {REFERENCE_PATH}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Load time and memory of the map data in every storage format, measured on the shipped maps/ files.
+
+    python benchmarks/bench_loading.py                     # all qualities, layers and formats
+    python benchmarks/bench_loading.py --quality Low_quality --repeat 3
+
+Formats: json (MapLayer.from_dict), topo (countries from polygons_topo.json), geo (geometry_codec),
+bundles (all gzipped chunks of maps/bundles into a ChunkedLayer) and sqlite (maps/maps.sqlite),
+every one that is built for a layer. load_data is the whole quality the way the game loads it.
+
+cold    - first load in a fresh interpreter (own subprocess, files in the OS cache, nothing parsed yet)
+warm    - best of --repeat loads in this process
+peak    - tracemalloc peak of one load
+rss     - growth of the resident set size of the process by the cold load (Linux only)
+kept    - memory the loaded layer keeps (tracemalloc, after the load), buffers - MapLayer.nbytes()
+Prints a table and writes all numbers to benchmarks/results/loading.json (--output).
+"""
+import argparse
+import gc
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import geometry_codec  # noqa: E402
+from bundles import MANIFEST_PATH  # noqa: E402
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, ChunkedLayer, MapLayer, layer_kind, load_data  # noqa: E402
+from sqlite_store import STORE_PATH, GeometryStore  # noqa: E402
+
+RESULTS_PATH = "benchmarks/results/loading.json"
+FORMATS = ["json", "topo", "geo", "bundles", "sqlite"]
+
+
+def json_path(quality, key):
+    return f"maps/{quality}/{LAYER_FILES[key]}.json"
+
+
+def source_files(fmt, quality, key):
+    """Files a format reads for a layer, None if the format is not built for it."""
+    path = json_path(quality, key)
+    if fmt == "json":
+        files = [path]
+    elif fmt == "topo":
+        files = [path[:-len(".json")] + "_topo.json"] if key == "polygons" else []
+    elif fmt == "geo":
+        files = [geometry_codec.encoded_path(path)]
+    elif fmt == "bundles":
+        if not os.path.exists(MANIFEST_PATH):
+            return None
+        with open(MANIFEST_PATH, "r") as f:
+            chunks = json.load(f)["layers"].get(quality, {}).get(key, [])
+        files = [os.path.join(os.path.dirname(MANIFEST_PATH), chunk["file"]) for chunk in chunks]
+    else:
+        files = [STORE_PATH] if os.path.exists(path) else []
+    if not files or not all(os.path.exists(file) for file in files):
+        return None
+    return files
+
+
+def load(fmt, quality, key, files):
+    """Load one layer from files of a format, bypassing the shared layer cache of load_layer."""
+    if fmt == "json":
+        with open(files[0], "r") as f:
+            return MapLayer.from_dict(key, json.load(f))
+    if fmt == "topo":
+        with open(files[0], "r") as f:
+            return MapLayer.from_topology(key, json.load(f))
+    if fmt == "geo":
+        with open(files[0], "rb") as f:
+            return geometry_codec.decode(f.read())
+    if fmt == "bundles":
+        layer = ChunkedLayer(layer_kind(key))
+        for file in files:
+            with open(file, "rb") as f:
+                layer.add_chunk(file, MapLayer.from_dict(key, json.loads(gzip.decompress(f.read()))))
+        return layer
+    with GeometryStore(files[0]) as store:
+        return store.load_layer(key, QUALITIES.index(quality))
+
+
+def load_case(fmt, quality, key, files):
+    if fmt == "load_data":  # only the layers the quality has, the quiz falls back to coarser ones
+        return load_data(quality, [os.path.exists(json_path(quality, key)) for key in LAYER_KEYS])
+    return load(fmt, quality, key, files)
+
+
+def resident_size():
+    """Resident set size of this process in bytes, None where /proc is missing."""
+    if not os.path.exists("/proc/self/statm"):
+        return None
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def layer_buffers(result):
+    """MapLayer.nbytes() of a layer, of all chunks or of all layers of a load_data dict."""
+    if isinstance(result, dict):
+        return sum(layer_buffers(layer) for layer in result.values())
+    if isinstance(result, ChunkedLayer):
+        return sum(chunk.nbytes() for chunk in result.chunks.values())
+    return result.nbytes()
+
+
+def measure_cold(fmt, quality, key, files):
+    """Time and RSS growth of the first load, run in a fresh interpreter (see child)."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", fmt, quality, key or "", *(files or [])]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def child(fmt, quality, key, files):
+    gc.collect()
+    rss = resident_size()
+    start = time.perf_counter()
+    result = load_case(fmt, quality, key, files)
+    seconds = time.perf_counter() - start
+    grown = None if rss is None else resident_size() - rss
+    print(json.dumps({"cold": seconds, "rss": grown, "buffers": layer_buffers(result)}))
+
+
+def measure_warm(fmt, quality, key, files, repeat):
+    """Best time of repeat loads, tracemalloc peak of one load and what the loaded layer keeps."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = load_case(fmt, quality, key, files)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        del result
+        gc.collect()
+    tracemalloc.start()
+    result = load_case(fmt, quality, key, files)
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"warm": best, "peak": peak, "kept": kept}
+
+
+def cases(qualities, keys, formats):
+    """Yield (quality, layer key or None, format, files) of every built combination."""
+    for quality in qualities:
+        for key in keys:
+            for fmt in formats:
+                files = source_files(fmt, quality, key)
+                if files is not None:
+                    yield quality, key, fmt, files
+        yield quality, None, "load_data", None
+
+
+def megabytes(value):
+    return "-" if value is None else f"{value / 2 ** 20:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quality", action="append", choices=QUALITIES, help="only this quality (repeatable)")
+    parser.add_argument("--layer", action="append", choices=LAYER_KEYS, help="only this layer key (repeatable)")
+    parser.add_argument("--format", action="append", choices=FORMATS, help="only this format (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="warm loads per case, the best one counts")
+    parser.add_argument("--output", default=RESULTS_PATH, help="JSON file for the results")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        fmt, quality, key, *files = args.child
+        child(fmt, quality, key or None, files)
+        return
+
+    rows = []
+    header = f"{'quality':<15} {'layer':<14} {'format':<10} {'size MB':>8} {'cold ms':>8} {'warm ms':>8} {'peak MB':>8} {'rss MB':>7} {'kept MB':>8} {'buffers MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for quality, key, fmt, files in cases(args.quality or QUALITIES, args.layer or LAYER_KEYS, args.format or FORMATS):
+        row = {"quality": quality, "layer": key, "format": fmt,
+               "size": sum(os.path.getsize(file) for file in files) if files else None}
+        row.update(measure_cold(fmt, quality, key, files))
+        row.update(measure_warm(fmt, quality, key, files, args.repeat))
+        rows.append(row)
+        print(f"{quality:<15} {key or 'all':<14} {fmt:<10} {megabytes(row['size']):>8} {row['cold'] * 1000:>8.1f} {row['warm'] * 1000:>8.1f} "
+              f"{megabytes(row['peak']):>8} {megabytes(row['rss']):>7} {megabytes(row['kept']):>8} {megabytes(row['buffers']):>10}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"python": sys.version.split()[0], "platform": sys.platform, "repeat": args.repeat,
+                   "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": rows}, f, indent=1)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
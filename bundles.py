@@ -0,0 +1,238 @@
+"""
+Compressed, chunked map bundles for the pygbag (browser) build.
+
+Build them with `python bundles.py` after the map JSON files change.
+Every layer of every quality is split into spatial chunks (grid over the world map),
+each chunk is written as gzipped compact JSON and described in maps/bundles/manifest.json.
+
+At runtime BundleStreamer decodes the chunks a few at a time between frames,
+Low quality first, then the chunks holding the current learning set, then the rest.
+In viewport mode only Low quality is streamed whole, Medium and High chunks are loaded
+as the view approaches them and released when it moves away (set_viewport).
+"""
+import asyncio
+import gzip
+import json
+import os
+import time
+
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, ChunkedLayer, MapLayer, layer_kind
+
+BUNDLE_DIR = "maps/bundles"
+MANIFEST_PATH = BUNDLE_DIR + "/manifest.json"
+GRID = 8  # chunks per side
+EXTENT = (-200, -200, 200, 200)  # world map is 400x400 with 0, 0 in the middle (original_map_size)
+
+
+def feature_bbox(key, value):
+    if layer_kind(key) == "points":
+        x, y = value["geometry"]
+        return [x, y, x, y]
+    boxes = [part["bbox"] for part in value["geometry"]]
+    if not boxes:
+        return None
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+def grid_cell(bbox, grid=GRID, extent=EXTENT):
+    """Grid cell (column, row) of the bbox center, clamped to the extent."""
+    cell_w = (extent[2] - extent[0]) / grid
+    cell_h = (extent[3] - extent[1]) / grid
+    center_x = (bbox[0] + bbox[2]) / 2
+    center_y = (bbox[1] + bbox[3]) / 2
+    column = min(grid - 1, max(0, int((center_x - extent[0]) // cell_w)))
+    row = min(grid - 1, max(0, int((center_y - extent[1]) // cell_h)))
+    return column, row
+
+
+def build_bundles(grid=GRID):
+    """Write the chunk files and the manifest, returns the manifest."""
+    manifest = {"version": 1, "grid": grid, "extent": EXTENT, "layers": {}}
+    for quality in QUALITIES:
+        manifest["layers"][quality] = {}
+        for key in LAYER_KEYS:
+            path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as f:
+                data = json.load(f)
+
+            cells = {}
+            for name, value in data.items():
+                bbox = feature_bbox(key, value)
+                if bbox is None:
+                    continue
+                cells.setdefault(grid_cell(bbox, grid), {})[name] = (value, bbox)
+
+            os.makedirs(f"{BUNDLE_DIR}/{quality}", exist_ok=True)
+            chunks = []
+            for (column, row), features in sorted(cells.items()):
+                file_name = f"{quality}/{LAYER_FILES[key]}_{column}_{row}.json.gz"
+                raw = json.dumps({name: value for name, (value, bbox) in features.items()}, separators=(",", ":")).encode()
+                with open(f"{BUNDLE_DIR}/{file_name}", "wb") as f:
+                    f.write(gzip.compress(raw, 9))
+                boxes = [bbox for value, bbox in features.values()]
+                chunks.append({"file": file_name,
+                               "cell": [column, row],
+                               "bbox": [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)],
+                               "names": list(features),
+                               "bytes": os.path.getsize(f"{BUNDLE_DIR}/{file_name}"),
+                               "raw_bytes": len(raw)})
+            manifest["layers"][quality][key] = chunks
+            print(quality, key, len(chunks), "chunks", os.path.getsize(path), "->", sum(c["bytes"] for c in chunks), "bytes")
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    return manifest
+
+
+def intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def expand(bbox, factor):
+    """Grow a bbox by factor times its size on every side."""
+    dx = (bbox[2] - bbox[0]) * factor
+    dy = (bbox[3] - bbox[1]) * factor
+    return bbox[0] - dx, bbox[1] - dy, bbox[2] + dx, bbox[3] + dy
+
+
+def decode_chunk(key, path):
+    with open(path, "rb") as f:
+        return MapLayer.from_dict(key, json.loads(gzip.decompress(f.read())))
+
+
+class BundleStreamer:
+    """
+    Loads bundles progressively into ChunkedLayers.
+    qualities - [Low, Medium, High] dicts of key -> ChunkedLayer, usable (and growing) right away.
+    """
+
+    def __init__(self, manifest_path=MANIFEST_PATH, viewport=False):
+        with open(manifest_path, "r") as f:
+            self.manifest = json.load(f)
+        self.directory = os.path.dirname(manifest_path)
+        self.qualities = [{key: ChunkedLayer(layer_kind(key)) for key in LAYER_KEYS} for _ in QUALITIES]
+        self.viewport = viewport  # only stream Medium / High chunks near the viewed region
+        self.view = None  # (map_index, world bbox) given by set_viewport
+        self.pending = []  # [quality index, key, chunk info]
+        for index, quality in enumerate(QUALITIES):
+            if viewport and index > 0:
+                continue  # queued by set_viewport / prioritize
+            for key, chunks in self.manifest["layers"].get(quality, {}).items():
+                for chunk in chunks:
+                    self.pending.append([index, key, chunk])
+        self.total = len(self.pending)
+        self.region = set()
+        self.sort_pending()
+
+    def sort_pending(self):
+        def priority(job):
+            index, key, chunk = job
+            if index == 0:
+                tier = 0  # Low quality is always first, it is what the world view needs
+            elif self.in_region(chunk) or (self.view is not None and intersects(chunk["bbox"], self.view[1])):
+                tier = 1
+            else:
+                tier = 2
+            return tier, index, chunk["bytes"]
+        # pending is used as a stack, the most important job is at the end
+        self.pending.sort(key=priority, reverse=True)
+
+    def in_region(self, chunk):
+        return bool(self.region) and any(name in self.region for name in chunk["names"])
+
+    def prioritize(self, items):
+        """Move chunks holding the items of a learning set ({key: [names]}) to the front."""
+        self.region = set(name for names in items.values() for name in names)
+        if self.viewport:
+            self.queue(lambda index, chunk: self.in_region(chunk))
+        self.sort_pending()
+
+    def queue(self, wanted):
+        """Add chunks of Medium / High quality for which wanted(quality index, chunk) is true and that are not loaded or pending."""
+        queued = set((index, chunk["file"]) for index, key, chunk in self.pending)
+        for index, quality in enumerate(QUALITIES):
+            if index == 0:
+                continue
+            for key, chunks in self.manifest["layers"].get(quality, {}).items():
+                layer = self.qualities[index][key]
+                for chunk in chunks:
+                    if chunk["file"] not in layer.chunks and (index, chunk["file"]) not in queued and wanted(index, chunk):
+                        self.pending.append([index, key, chunk])
+                        self.total += 1
+
+    def set_viewport(self, map_index, bbox):
+        """
+        Stream Medium / High chunks by the viewed region (world bbox min_x, min_y, max_x, max_y) in viewport mode.
+        Chunks of qualities up to map_index within half a view of the region are loaded,
+        chunks further than a whole view away (or of finer qualities) are released, learning set chunks stay.
+        """
+        if not self.viewport or (map_index, bbox) == self.view:
+            return
+        self.view = (map_index, bbox)
+        load_range = expand(bbox, 0.5)
+        keep_range = expand(bbox, 1)
+
+        def wanted(index, chunk, area):
+            return self.in_region(chunk) or (index <= map_index and intersects(chunk["bbox"], area))
+
+        for index in range(1, len(QUALITIES)):
+            for key, layer in self.qualities[index].items():
+                for chunk in self.manifest["layers"].get(QUALITIES[index], {}).get(key, []):
+                    if chunk["file"] in layer.chunks and not wanted(index, chunk, keep_range):
+                        layer.remove_chunk(chunk["file"])
+        self.pending = [job for job in self.pending if job[0] == 0 or wanted(job[0], job[2], keep_range)]
+        self.queue(lambda index, chunk: wanted(index, chunk, load_range))
+        self.sort_pending()
+
+    def done(self):
+        return not self.pending
+
+    def progress(self):
+        """Fraction of chunks already decoded (0..1)."""
+        if not self.total:
+            return 1.0
+        return 1 - len(self.pending) / self.total
+
+    def ready_for(self, items):
+        """True once Low quality and the chunks holding the items ({key: [names]}) are decoded."""
+        names = set(name for names in items.values() for name in names)
+        for index, key, chunk in self.pending:
+            if index == 0 or any(name in names for name in chunk["names"]):
+                return False
+        return True
+
+    def request(self, index, key):
+        """Stream the chunks of a layer again (after the memory manager released it), next in line."""
+        layer = self.qualities[index][key]
+        queued = set(chunk["file"] for job_index, job_key, chunk in self.pending if job_index == index and job_key == key)
+        for chunk in self.manifest["layers"].get(QUALITIES[index], {}).get(key, []):
+            if self.viewport and index > 0 and self.view is not None and not (self.in_region(chunk) or intersects(chunk["bbox"], expand(self.view[1], 0.5))):
+                continue
+            if chunk["file"] not in layer.chunks and chunk["file"] not in queued:
+                self.pending.append([index, key, chunk])
+                self.total += 1
+
+    def release(self, index, key):
+        self.qualities[index][key] = ChunkedLayer(layer_kind(key))
+
+    async def run(self, budget_ms=8):
+        """Decode everything, giving the main loop a frame after every time slice."""
+        while self.step(budget_ms):
+            await asyncio.sleep(0)
+
+    def step(self, budget_ms=8):
+        """Decode chunks until the time budget runs out (at least one), returns True while work remains."""
+        start = time.perf_counter()
+        while self.pending:
+            index, key, chunk = self.pending.pop()
+            layer = decode_chunk(key, os.path.join(self.directory, chunk["file"]))
+            self.qualities[index][key].add_chunk(chunk["file"], layer)
+            if (time.perf_counter() - start) * 1000 > budget_ms:
+                break
+        return bool(self.pending)
+
+
+if __name__ == "__main__":
+    build_bundles()
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, load_layer
+from sqlite_store import GeometryStore, store_is_current
+
+
+class DataLoader:
+    """
+    Loads the map JSON files in the background while the menu is already running.
+
+    qualities - [Low, Medium, High] dicts of key -> MapLayer, a layer appears in them when it is loaded.
+    Low quality goes first, on desktop files are parsed on an executor thread,
+    in the browser (no threads) one file is parsed per frame.
+    Layers are read from the SQLite store instead if it is built and up to date (see sqlite_store.py).
+    """
+
+    def __init__(self):
+        self.qualities = [{} for _ in QUALITIES]
+        self.pending = []  # [quality index, key, path]
+        for index, quality in enumerate(QUALITIES):
+            for key in LAYER_KEYS:
+                path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+                if os.path.exists(path):  # missing qualities fall back to coarser data in the quiz
+                    self.pending.append([index, key, path])
+        self.total = len(self.pending)
+        self.pending.reverse()  # used as a stack
+        self.use_executor = sys.platform != "emscripten"
+        self.use_store = store_is_current()
+
+    def prioritize(self, items):
+        """Load the layers used by a learning set ({key: [names]}) first."""
+        keys = set(key for key, names in items.items() if names)
+        self.pending.sort(key=lambda job: (job[0] == 0, job[1] in keys), reverse=False)
+
+    def done(self):
+        return not self.pending
+
+    def progress(self):
+        """Fraction of files already loaded (0..1)."""
+        if not self.total:
+            return 1.0
+        return 1 - len(self.pending) / self.total
+
+    def ready_for(self, items):
+        """True once everything a quiz over items needs is loaded: Low quality and the layers of its items."""
+        keys = set(key for key, names in items.items() if names)
+        for index, key, path in self.pending:
+            if index == 0 or key in keys:
+                return False
+        return True
+
+    def request(self, index, key):
+        """Load a layer again (after the memory manager released it), next in line."""
+        path = f"maps/{QUALITIES[index]}/{LAYER_FILES[key]}.json"
+        if os.path.exists(path) and [index, key, path] not in self.pending:
+            self.pending.append([index, key, path])
+            self.total += 1
+
+    def set_viewport(self, map_index, bbox):
+        """Whole files are loaded, the view does not matter (BundleStreamer streams by it)."""
+
+    def release(self, index, key):
+        self.qualities[index].pop(key, None)
+
+    def load(self, index, key, path):
+        if self.use_store:
+            with GeometryStore() as store:  # a connection per call, it may run on the executor thread
+                return store.load_layer(key, index)
+        return load_layer(path, key)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            index, key, path = self.pending.pop()
+            if self.use_executor:
+                layer = await loop.run_in_executor(None, self.load, index, key, path)
+            else:
+                layer = self.load(index, key, path)
+            self.qualities[index][key] = layer
+            await asyncio.sleep(0)  # let the main loop draw a frame
@@ -0,0 +1,38 @@
+import os
+
+import pygame
+
+# put e.g. fonts/monospace.ttf here to skip the system font lookup (needed for a stable look under pygbag)
+FONT_DIR = "fonts"
+
+font_paths = {}  # family -> path of the font file (None = pygame default font)
+fonts = {}  # (family, size) -> pygame.font.Font
+
+
+def find_font_path(family):
+    """Resolve the font file of a family once, bundled fonts first, then system fonts."""
+    family = family.lower()
+    if family not in font_paths:
+        path = None
+        for extension in (".ttf", ".otf"):
+            bundled = os.path.join(FONT_DIR, family + extension)
+            if os.path.exists(bundled):
+                path = bundled
+                break
+        if path is None:
+            path = pygame.font.match_font(family)
+        font_paths[family] = path
+    return font_paths[family]
+
+
+def get_font(family, size):
+    """
+    Return the shared font of (family, size), it is created only the first time.
+    Replaces pygame.font.SysFont calls in managers and buttons.
+    """
+    key = (family.lower(), size)
+    font = fonts.get(key)
+    if font is None:
+        font = pygame.font.Font(find_font_path(family), size)
+        fonts[key] = font
+    return font
@@ -0,0 +1,282 @@
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from geometry import box_overlap_percent, clip_polygon_to_screen
+
+try:  # optional, big rings are transformed with numpy which releases the GIL
+    import numpy as np
+except ImportError:
+    np = None
+
+# everything a frame of the map depends on
+View = namedtuple("View", ["map_index", "scale", "x", "y", "width", "height"])
+
+HOLD_TIMEOUT = 0.1  # seconds the worker waits for a held frame at most, it never waits for a preparer that is gone
+NUMPY_MIN_VERTICES = 200  # smaller parts are faster in plain python
+VERTEX_BYTES = 120  # a prepared screen point: tuple / list of two floats and its slot in the shape list
+
+
+def scale_bbox(bbox, view):
+    """Scale and translate a bounding box (min_x, min_y, max_x, max_y)."""
+    min_x, min_y, max_x, max_y = bbox
+    return (min_x * view.scale + view.x,
+            -max_y * view.scale + view.y,  # note: Y flipped
+            max_x * view.scale + view.x,
+            -min_y * view.scale + view.y)
+
+
+def scale_coords(coords, view):
+    """Scale and translate a flat x, y sequence (MapLayer part) to a list of screen points."""
+    scale = view.scale
+    offset_x, offset_y = view.x, view.y
+    if np is not None and len(coords) >= NUMPY_MIN_VERTICES * 2:
+        points = np.frombuffer(coords, dtype=np.float64).reshape(-1, 2) * (scale, -scale) + (offset_x, offset_y)
+        return points.tolist()
+    return [(x * scale + offset_x, -y * scale + offset_y) for x, y in zip(coords[0::2], coords[1::2])]
+
+
+def visible_polygons(layer, view):
+    """Yield (screen polygon, name) of country parts on screen, big mostly hidden ones are clipped."""
+    screen_w, screen_h = view.width, view.height
+
+    # parts too small for the scale are cut off by min_scale before any screen test
+    for part, name, bbox in layer.iter_parts(view.scale):
+        scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = scale_bbox(bbox, view)
+
+        # Quick reject: check if bbox overlaps screen
+        if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
+            continue
+
+        scaled_polygon = scale_coords(layer.part_coords(part), view)
+        if len(scaled_polygon) > 30:
+            overlapp = box_overlap_percent([0, 0, screen_w, screen_h], [scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y], relative_to="B")
+            if overlapp < 10:
+                scaled_polygon = clip_polygon_to_screen(polygon=scaled_polygon, screen_width=screen_w, screen_height=screen_h)
+
+            if len(scaled_polygon) < 3:
+                continue
+
+        yield scaled_polygon, name
+
+
+def visible_lines(layer, view):
+    """Yield (screen line, name) of river parts on screen that are long enough for the scale."""
+    screen_w, screen_h = view.width, view.height
+
+    for part, name, bbox in layer.iter_parts(view.scale):
+        scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = scale_bbox(bbox, view)
+
+        if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
+            continue
+
+        yield scale_coords(layer.part_coords(part), view), name
+
+
+def visible_areas(layer, view):
+    """Yield (screen polygon, name) of lake / custom polygon parts on screen that are at least 2 px big."""
+    screen_w, screen_h = view.width, view.height
+
+    # parts too small for the scale are cut off by min_scale before any screen test
+    for part, name, bbox in layer.iter_parts(view.scale):
+        scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = scale_bbox(bbox, view)
+
+        # Quick reject: check if bbox overlaps screen
+        if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
+            continue
+
+        yield scale_coords(layer.part_coords(part), view), name
+
+
+def visible_points(layer, view):
+    """Yield (screen point, name, rank, capital) of cities on screen that are important enough for the scale."""
+    screen_w, screen_h = view.width, view.height
+    scale = view.scale
+
+    # cities of low importance are cut off by min_scale (from their rank)
+    for name, x, y, rank, capital in layer.iter_points(scale):
+        scaled_x, scaled_y = x * scale + view.x, -y * scale + view.y
+
+        if scaled_x < 0 or scaled_x > screen_w or scaled_y < 0 or scaled_y > screen_h:
+            continue
+
+        yield (scaled_x, scaled_y), name, rank, capital
+
+
+# layer key -> function preparing its visible geometry
+PREPARE = {"polygons": visible_polygons,
+           "lines": visible_lines,
+           "blue_polygons": visible_areas,
+           "points": visible_points,
+           "new_polygons": visible_areas,
+           "borders": visible_lines}
+
+
+def prepare_layer(key, layer, view):
+    if layer is None:
+        return []
+    return list(PREPARE[key](layer, view))
+
+
+def view_bbox(view):
+    """Map bbox (min_x, min_y, max_x, max_y) of the screen of a view."""
+    return (-view.x / view.scale,
+            (view.y - view.height) / view.scale,  # note: Y flipped
+            (view.width - view.x) / view.scale,
+            view.y / view.scale)
+
+
+def layer_version(layer, view):
+    """
+    Changes whenever the content of a layer drawn in the view changes (reloaded, chunks streamed in / released).
+    Holds the layer itself, not its id, so a new layer can not reuse the id of a freed one.
+    Of a ChunkedLayer only the chunks reaching into the view count (bundle chunks never change),
+    so chunks streaming in off screen do not make the prepared frame stale.
+    """
+    chunks_in = getattr(layer, "chunks_in", None)
+    if chunks_in is not None:
+        return layer, chunks_in(view_bbox(view))
+    return layer, getattr(layer, "version", 0)
+
+
+def frame_key(view, layers):
+    """Identifies a prepared frame: the view and the content of every layer drawn in it."""
+    return view, tuple((name, layer_version(layer, view)) for name, layer in layers.items())
+
+
+def prepare_frame(view, layers, gate=None):
+    """Frame for view, with a gate (threading.Event) every feature waits until it is set (see FramePreparer.hold)."""
+    if gate is None:
+        return {name: prepare_layer(name, layer, view) for name, layer in layers.items()}
+    out = {}
+    for name, layer in layers.items():
+        shapes = out[name] = []
+        if layer is None:
+            continue
+        for shape in PREPARE[name](layer, view):
+            gate.wait(HOLD_TIMEOUT)
+            shapes.append(shape)
+    return out
+
+
+worker = None  # one thread shared by all preparers, started on first use
+
+
+def get_worker():
+    global worker
+    if worker is None:
+        worker = ThreadPoolExecutor(max_workers=1)
+    return worker
+
+
+def count_vertices(frame):
+    return sum(len(shape[0]) if isinstance(shape[0], list) else 1 for shapes in frame.values() for shape in shapes)
+
+
+class FramePreparer:
+    """
+    Prepares the visible geometry of the map (culling, scaling, clipping) for a view.
+
+    Output is double buffered: the finished frame (front) is what is being drawn, the next one is
+    built into back and the buffers are swapped when it is complete. If neither the view nor the data
+    changed the front frame is reused as is. With threads (not in the browser) the next frame is
+    prepared on a worker thread while the main thread keeps drawing the front one, the main thread never
+    waits for the worker (see prepare_steps and swap). The threads share the GIL, so while the main
+    thread works on a frame it holds the worker (hold / release) and the worker prepares while the main
+    loop waits for the next frame.
+    A finished frame is never changed afterwards, so callers can keep it while newer ones are prepared.
+    """
+
+    def __init__(self, threaded=None):
+        if threaded is None:
+            threaded = sys.platform != "emscripten"
+        self.threaded = threaded
+        self.front = {"key": None, "layers": {}}
+        self.back = {"key": None, "layers": {}}
+        self.job = None  # (key, future) preparing the back buffer on the worker
+        self.pending = None  # (key, view, layers) submitted when the running job is done
+        self.gate = threading.Event()  # set while the worker may run
+        self.gate.set()
+
+    def nbytes(self):
+        """Approximate memory of both buffers, a screen point costs about VERTEX_BYTES."""
+        return (self.front.get("vertices", 0) + self.back.get("vertices", 0)) * VERTEX_BYTES
+
+    def clear(self):
+        self.front = {"key": None, "layers": {}}
+        self.back = {"key": None, "layers": {}}
+        self.job = None  # a running job finishes, its frame is dropped
+        self.pending = None
+
+    def prepare(self, view, layers):
+        """
+        Return dict key -> list of prepared geometry for the view, prepared on this thread if the front
+        frame is not the one (for frames needed at once, Low quality is quick enough).
+        layers - dict key -> layer (or None) to prepare, already resolved for view.map_index.
+        """
+        key = frame_key(view, layers)
+        if key != self.front["key"]:
+            self.back = {"key": key, "layers": prepare_frame(view, layers)}
+            self.publish()
+        return self.front["layers"]
+
+    def prepare_steps(self, view, layers):
+        """
+        Generator preparing the same frame as prepare() for time slicing, it becomes the front frame
+        after the last step. With threads the worker prepares it, the generator yields True while it
+        is not done. Without them it is prepared here one feature per step.
+        """
+        key = frame_key(view, layers)
+        if key == self.front["key"]:
+            return
+        if self.threaded:
+            while self.front["key"] != key:
+                if not self.swap():
+                    self.submit(key, view, layers)
+                    yield True
+            return
+
+        out = {}
+        for name, layer in layers.items():
+            shapes = out[name] = []
+            if layer is None:
+                continue
+            for shape in PREPARE[name](layer, view):
+                shapes.append(shape)
+                yield
+        self.back = {"key": key, "layers": out}
+        self.publish()
+
+    def submit(self, key, view, layers):
+        """Prepare the frame on the worker, after the running job if there is one."""
+        if self.job is None:
+            self.job = key, get_worker().submit(prepare_frame, view, layers, self.gate)
+        elif self.job[0] != key:
+            self.pending = key, view, layers
+
+    def hold(self):
+        """The main thread works on a frame, the worker stops after the feature it prepares (HOLD_TIMEOUT at most)."""
+        self.gate.clear()
+
+    def release(self):
+        """The main thread waits for the next frame, the worker may go on."""
+        self.gate.set()
+
+    def swap(self):
+        """Make the frame of the worker the front one if its job is done, returns True if it was swapped."""
+        if self.job is None or not self.job[1].done():
+            return False
+        key, job = self.job
+        self.job = None
+        self.back = {"key": key, "layers": job.result()}  # done, does not wait, re-raises errors of the worker
+        self.publish()
+        if self.pending is not None:
+            self.submit(*self.pending)
+            self.pending = None
+        return True
+
+    def publish(self):
+        """Swap the buffers, the finished back frame becomes the front one."""
+        self.back["vertices"] = count_vertices(self.back["layers"])
+        self.front, self.back = self.back, self.front
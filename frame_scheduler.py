@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pygame
+
+ACTIVE_FPS = 60
+IDLE_FPS = 4  # hover effects and the loading progress still update while idle
+ACTIVE_GRACE = 0.5  # seconds the full rate is kept after the last activity
+POLL_INTERVAL = 0.01  # seconds between the checks for new events while idle
+
+
+class FrameScheduler:
+    """
+    Decides how long the main loop waits before the next frame.
+
+    The loop runs at ACTIVE_FPS while something is going on (input events, a pressed mouse button,
+    animations, map data streaming in) and for ACTIVE_GRACE after it. Otherwise it waits for the
+    next event, the next deadline (an expiring highlight) or 1 / IDLE_FPS at the latest.
+    The idle wait sleeps in POLL_INTERVAL steps (asyncio, so the browser and the loading tasks keep
+    running) and only peeks at the event queue, the events stay in their order for the main loop.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.active_until = 0
+        self.deadlines = []
+        self.wait_callbacks = []
+
+    def busy(self):
+        """Something is going on this frame, keep the full frame rate."""
+        self.active_until = time.perf_counter() + ACTIVE_GRACE
+
+    def wake_at(self, ticks):
+        """Make sure a frame is drawn right after pygame.time.get_ticks() reaches ticks."""
+        self.deadlines.append(ticks)
+
+    def on_wait(self, callback):
+        """Call callback once when the loop starts waiting for the next frame (after the display flip)."""
+        self.wait_callbacks.append(callback)
+
+    def start_wait(self):
+        for callback in self.wait_callbacks:
+            callback()
+        self.wait_callbacks.clear()
+
+    def idle(self):
+        return time.perf_counter() >= self.active_until
+
+    async def wait(self):
+        """Wait for the next frame, call once per frame instead of clock.tick."""
+        self.start_wait()
+        if not self.idle():
+            self.deadlines.clear()
+            self.clock.tick(ACTIVE_FPS)
+            await asyncio.sleep(0)
+            return
+
+        timeout = 1000 // IDLE_FPS
+        ticks = pygame.time.get_ticks()
+        for deadline in self.deadlines:
+            if deadline >= ticks:
+                timeout = min(timeout, deadline - ticks + 1)
+        self.deadlines.clear()
+
+        end = time.perf_counter() + timeout / 1000
+        while not pygame.event.peek():
+            remaining = end - time.perf_counter()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+        self.clock.tick()
@@ -0,0 +1,207 @@
+from typing import List, Tuple
+
+Point = Tuple[float, float]
+Polygon = List[Point]
+
+def clip_polygon_to_screen(polygon: Polygon, screen_width: float, screen_height: float, margin: float = 0) -> Polygon:
+    """
+    Clips a polygon to the rectangle [0, screen_width] x [0, screen_height]
+    using the Sutherland–Hodgman polygon clipping algorithm.
+    Automatically removes crossing lines across the screen edges.
+    The rectangle can be grown by margin on every side.
+    """
+    low = -margin
+    screen_width += margin
+    screen_height += margin
+
+    def inside(p: Point, edge: str) -> bool:
+        x, y = p
+        if edge == "left": return x >= low
+        if edge == "right": return x <= screen_width
+        if edge == "bottom": return y >= low
+        if edge == "top": return y <= screen_height
+        return True
+
+    def intersect(p1: Point, p2: Point, edge: str) -> Point:
+        x1, y1 = p1
+        x2, y2 = p2
+        if x1 == x2 and y1 == y2:
+            return p1
+
+        if edge == "left":
+            x, y = low, y1 + (y2 - y1) * (low - x1) / (x2 - x1)
+        elif edge == "right":
+            x, y = screen_width, y1 + (y2 - y1) * (screen_width - x1) / (x2 - x1)
+        elif edge == "bottom":
+            x, y = x1 + (x2 - x1) * (low - y1) / (y2 - y1), low
+        elif edge == "top":
+            x, y = x1 + (x2 - x1) * (screen_height - y1) / (y2 - y1), screen_height
+        return (x, y)
+
+    def clip_edge(polygon: Polygon, edge: str) -> Polygon:
+        clipped = []
+        if not polygon:
+            return clipped
+
+        prev_point = polygon[-1]
+        for curr_point in polygon:
+            prev_inside = inside(prev_point, edge)
+            curr_inside = inside(curr_point, edge)
+
+            if curr_inside:
+                if not prev_inside:
+                    clipped.append(intersect(prev_point, curr_point, edge))
+                clipped.append(curr_point)
+            elif prev_inside:
+                clipped.append(intersect(prev_point, curr_point, edge))
+
+            prev_point = curr_point
+        return clipped
+
+    # Clip polygon against all 4 screen edges
+    clipped_poly = polygon[:]
+    for edge in ["left", "right", "bottom", "top"]:
+        clipped_poly = clip_edge(clipped_poly, edge)
+        if not clipped_poly:
+            break
+
+    return clipped_poly
+
+def box_overlap_percent(boxA, boxB, relative_to="A"):
+    """
+    Calculate how much of one box overlaps another, as a percentage.
+
+    Parameters:
+        boxA, boxB: tuples (x1, y1, x2, y2)
+            Each box is defined by top-left (x1, y1) and bottom-right (x2, y2).
+        relative_to: str, optional
+            "A" (default) — overlap as % of boxA area
+            "B" — overlap as % of boxB area
+            "union" — overlap as % of union area
+
+    Returns:
+        float: Overlap percentage (0–100)
+    """
+
+    # Ensure coordinates are ordered correctly
+    x1A, y1A = sorted([boxA[0], boxA[2]]), sorted([boxA[1], boxA[3]])
+    x1B, y1B = sorted([boxB[0], boxB[2]]), sorted([boxB[1], boxB[3]])
+
+    # Compute overlap bounds
+    x_left = max(x1A[0], x1B[0])
+    y_top = max(y1A[0], y1B[0])
+    x_right = min(x1A[1], x1B[1])
+    y_bottom = min(y1A[1], y1B[1])
+
+    # Check for no overlap
+    if x_right <= x_left or y_bottom <= y_top:
+        return 0.0
+
+    # Areas
+    areaA = (x1A[1] - x1A[0]) * (y1A[1] - y1A[0])
+    areaB = (x1B[1] - x1B[0]) * (y1B[1] - y1B[0])
+    intersection = (x_right - x_left) * (y_bottom - y_top)
+    union = areaA + areaB - intersection
+
+    if relative_to == "B":
+        base = areaB
+    elif relative_to == "union":
+        base = union
+    else:
+        base = areaA
+
+    return 100.0 * intersection / base
+
+
+def circle_polygon_collision(circle_center, circle_radius, polygon_points):
+    """
+    Check if a circle intersects a polygon.
+
+    Args:
+        circle_center (tuple): (x, y) of circle center in screen coords
+        circle_radius (float): circle radius
+        polygon_points (list): list of tuples of (x, y) coordinates
+
+    Returns:
+        bool
+    """
+    cx, cy = circle_center
+
+    # --- 2. Check if circle center is inside polygon (ray-casting) ---
+    inside = False
+    n = len(polygon_points)
+    for i in range(n):
+        x1, y1 = polygon_points[i]
+        x2, y2 = polygon_points[(i + 1) % n]
+        if ((y1 > cy) != (y2 > cy)) and \
+                (cx < (x2 - x1) * (cy - y1) / (y2 - y1 + 1e-12) + x1):
+            inside = not inside
+    if inside:
+        return True
+
+    # --- 3. Check distance to polygon edges ---
+    for i in range(n):
+        x1, y1 = polygon_points[i]
+        x2, y2 = polygon_points[(i + 1) % n]
+
+        # Closest point on line segment to circle center
+        dx, dy = x2 - x1, y2 - y1
+        if dx == 0 and dy == 0:  # Degenerate edge
+            dist_sq = (cx - x1) ** 2 + (cy - y1) ** 2
+        else:
+            t = max(0, min(1, ((cx - x1) * dx + (cy - y1) * dy) / (dx * dx + dy * dy)))
+            closest_x = x1 + t * dx
+            closest_y = y1 + t * dy
+            dist_sq = (cx - closest_x) ** 2 + (cy - closest_y) ** 2
+
+        if dist_sq <= circle_radius ** 2:
+            return True
+
+    return False
+
+
+def circle_polyline_collision(circle_center, circle_radius, line_points):
+    """
+    Check if a circle intersects a polyline (open multipoint line).
+
+    Args:
+        circle_center (tuple): (x, y) of circle center in screen coords
+        circle_radius (float): circle radius
+        line_points (list): list of tuples of (x, y) coordinates defining the line
+
+    Returns:
+        bool
+    """
+    cx, cy = circle_center
+    n = len(line_points)
+
+    if n < 2:
+        return False  # Need at least two points to form a line segment
+
+    # Check distance to each line segment
+    for i in range(n - 1):
+        x1, y1 = line_points[i]
+        x2, y2 = line_points[i + 1]
+
+        dx, dy = x2 - x1, y2 - y1
+        if dx == 0 and dy == 0:  # Degenerate segment (single point)
+            dist_sq = (cx - x1) ** 2 + (cy - y1) ** 2
+        else:
+            # Projection factor clamped to [0,1]
+            t = max(0, min(1, ((cx - x1) * dx + (cy - y1) * dy) / (dx * dx + dy * dy)))
+            closest_x = x1 + t * dx
+            closest_y = y1 + t * dy
+            dist_sq = (cx - closest_x) ** 2 + (cy - closest_y) ** 2
+
+        if dist_sq <= circle_radius ** 2:
+            return True
+
+    return False
+
+
+def circle_point_collision(circle_center, circle_radius, point_pos):
+    dist_sqrt = (circle_center[0] - point_pos[0]) ** 2 + (circle_center[1] - point_pos[1]) ** 2
+
+    if dist_sqrt <= circle_radius ** 2:
+        return True
+    return False
@@ -0,0 +1,293 @@
+"""
+Compact binary encoding of the map layers (maps/<quality>/<file>.geo).
+
+The JSON files spell every coordinate as a 17 digit decimal, most of it far below screen precision.
+Here coordinates are rounded to a grid (QUANTUM, finer for the qualities used at bigger zoom),
+every vertex is stored as the difference to the previous one and all integers are written
+as zigzag varints, so a typical vertex takes 2-4 bytes instead of ~40.
+
+Layout (all integers varints, signed ones zigzag):
+    b"MGEO" version kind flags quantum(float64, little endian)
+    [flags & TOPOLOGY] arc count, vertex count of every arc
+    feature count, every feature: name length, utf-8 name,
+        points: rank + 1 (0 = none), capital
+        other: scalerank + 1 (0 = none), part count, vertex count of every part
+        topology: ref count, refs ... of every ring
+    part count, min_scale of every part (float32, little endian, see map_layer.part_min_scale)
+    [flags & TOPOLOGY] min_scale of every arc (float32)
+    vertex count, dx dy of all vertices (arcs / parts / points in the order above)
+
+min_scale is computed here when the file is built, decode only reads it.
+The coordinates are one continuous stream of deltas, so the decoder turns them back into
+the flat coordinate buffer of a MapLayer in one pass (vectorized with numpy if installed).
+
+Build with `python geometry_codec.py` (writes the .geo files next to the JSON and prints
+size and decode speed compared to json.load), load_layer uses a .geo file when it is
+not older than its JSON source.
+"""
+import json
+import os
+import struct
+import time
+from array import array
+
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, MapLayer, current_topology, layer_kind
+from topology import ring_from_arcs
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"MGEO"
+VERSION = 3
+KINDS = ["points", "lines", "polygons"]
+TOPOLOGY = 1
+# grid size of the coordinates (map units, the world is 400 wide) per quality,
+# Low is drawn below scale 10, Medium below 120, High up to 300 - all stay under 0.2 px
+QUANTUM = {"Low_quality": 0.01, "Medium_quality": 0.001, "High_quality": 0.0005}
+
+
+def write_varint(out, value):
+    while value > 127:
+        out.append((value & 127) | 128)
+        value >>= 7
+    out.append(value)
+
+
+def write_signed(out, value):
+    write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def encode(key, data, quantum):
+    """
+    Encode the JSON structure of a layer file, or a topology (see topology.py) of the countries layer.
+    Returns bytes.
+    """
+    kind = layer_kind(key)
+    topology = "arcs" in data
+    out = bytearray(MAGIC)
+    out += bytes((VERSION, KINDS.index(kind), TOPOLOGY if topology else 0))
+    out += struct.pack("<d", quantum)
+    vertices = []
+
+    if topology:
+        write_varint(out, len(data["arcs"]))
+        for arc in data["arcs"]:
+            write_varint(out, len(arc))
+            vertices.extend(arc)
+        features = data["objects"]
+    else:
+        features = data
+    # zoom culling thresholds, computed on the full precision geometry
+    source = MapLayer.from_topology(key, data) if topology else MapLayer.from_dict(key, data)
+
+    write_varint(out, len(features))
+    for name, value in features.items():
+        raw_name = name.encode("utf-8")
+        write_varint(out, len(raw_name))
+        out += raw_name
+        if kind == "points":
+            rank = value.get("rank")
+            write_varint(out, 0 if rank is None else rank + 1)
+            write_varint(out, 1 if value.get("capital", False) else 0)
+            vertices.append(value["geometry"])
+        elif topology:  # objects are lists of rings, no attributes
+            write_varint(out, len(value))
+            for refs in value:
+                write_varint(out, len(refs))
+                for ref in refs:
+                    write_signed(out, ref)
+        else:
+            scalerank = value.get("scalerank")
+            write_varint(out, 0 if scalerank is None else scalerank + 1)
+            parts = [part["points"] for part in value["geometry"] if part["points"]]
+            write_varint(out, len(parts))
+            for points in parts:
+                write_varint(out, len(points))
+                vertices.extend(points)
+
+    write_varint(out, len(source.min_scales))
+    out += struct.pack(f"<{len(source.min_scales)}f", *source.min_scales)
+    if topology:
+        out += struct.pack(f"<{len(source.arcs.min_scales)}f", *source.arcs.min_scales)
+
+    write_varint(out, len(vertices))
+    previous_x = previous_y = 0
+    for x, y in vertices:
+        qx, qy = round(x / quantum), round(y / quantum)
+        write_signed(out, qx - previous_x)
+        write_signed(out, qy - previous_y)
+        previous_x, previous_y = qx, qy
+    return bytes(out)
+
+
+def decode_stream(raw, pos, count, quantum):
+    """Decode count varints from raw[pos:] as x, y deltas, returns the flat array("d") of coordinates."""
+    if count == 0:
+        return array("d")
+    if np is not None:
+        data = np.frombuffer(raw, dtype=np.uint8, offset=pos)
+        if data.max() < 128:  # every value fits one byte
+            values = data[:count].astype(np.int64)
+        else:
+            ends = np.flatnonzero(data < 128)[:count]
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            lengths = ends - starts + 1
+            group = np.repeat(np.arange(count), lengths)
+            shift = np.arange(group.size) - np.repeat(starts, lengths)
+            # float sums are exact here, coordinates are far below 2 ** 53 grid steps
+            values = np.bincount(group, weights=(data[:group.size].astype(np.int64) & 127) << (7 * shift), minlength=count).astype(np.int64)
+        deltas = (values >> 1) ^ -(values & 1)
+        coords = np.cumsum(deltas.reshape(-1, 2), axis=0) * quantum
+        return array("d", coords.ravel().tobytes())
+
+    coords = array("d", bytes(8 * count))
+    x = y = 0
+    for i in range(0, count, 2):
+        value = 0
+        shift = 0
+        while True:
+            byte = raw[pos]
+            pos += 1
+            value |= (byte & 127) << shift
+            if byte < 128:
+                break
+            shift += 7
+        x += (value >> 1) ^ -(value & 1)
+        value = 0
+        shift = 0
+        while True:
+            byte = raw[pos]
+            pos += 1
+            value |= (byte & 127) << shift
+            if byte < 128:
+                break
+            shift += 7
+        y += (value >> 1) ^ -(value & 1)
+        coords[i] = x * quantum
+        coords[i + 1] = y * quantum
+    return coords
+
+
+def decode(raw):
+    """Decode bytes written by encode() into a MapLayer (with arcs for a topology)."""
+    if raw[:4] != MAGIC or raw[4] != VERSION:
+        raise ValueError("not a map geometry file (version %d)" % VERSION)
+    kind = KINDS[raw[5]]
+    topology = raw[6] & TOPOLOGY
+    quantum = struct.unpack_from("<d", raw, 7)[0]
+    pos = 15
+
+    def read_varint():
+        nonlocal pos
+        value = 0
+        shift = 0
+        while True:
+            byte = raw[pos]
+            pos += 1
+            value |= (byte & 127) << shift
+            if byte < 128:
+                return value
+            shift += 7
+
+    def read_signed():
+        value = read_varint()
+        return (value >> 1) ^ -(value & 1)
+
+    arc_sizes = []
+    if topology:
+        arc_sizes = [read_varint() for _ in range(read_varint())]
+
+    features = []  # (name, part vertex counts or rings of arc refs, rank, capital, scalerank)
+    for _ in range(read_varint()):
+        length = read_varint()
+        name = raw[pos:pos + length].decode("utf-8")
+        pos += length
+        if kind == "points":
+            rank = read_varint() - 1
+            capital = bool(read_varint())
+            features.append((name, [1], None if rank < 0 else rank, capital, None))
+        elif topology:
+            rings = [[read_signed() for _ in range(read_varint())] for _ in range(read_varint())]
+            features.append((name, rings, None, False, None))
+        else:
+            scalerank = read_varint() - 1
+            features.append((name, [read_varint() for _ in range(read_varint())], None, False, None if scalerank < 0 else scalerank))
+
+    part_count = read_varint()
+    min_scales = array("d", struct.unpack_from(f"<{part_count}f", raw, pos))
+    pos += 4 * part_count
+    if topology:
+        arc_scales = array("d", struct.unpack_from(f"<{len(arc_sizes)}f", raw, pos))
+        pos += 4 * len(arc_sizes)
+
+    count = read_varint()
+    coords = decode_stream(raw, pos, count * 2, quantum)
+
+    if not topology:
+        return MapLayer.from_buffers(kind, features, coords, min_scales=min_scales)
+
+    # rings of a topology are rebuilt from the arcs like in MapLayer.from_topology
+    arcs = []
+    offset = 0
+    for size in arc_sizes:
+        part = coords[offset * 2:(offset + size) * 2]
+        arcs.append(list(zip(part[0::2], part[1::2])))
+        offset += size
+    layer = MapLayer(kind, zoom_culling=False)  # min_scales come from the file
+    for name, rings, rank, capital, scalerank in features:
+        layer.add_feature(name, [ring_from_arcs(arcs, refs) for refs in rings])
+    layer.min_scales = min_scales
+    layer.zoom_culling = True
+    layer.arcs = MapLayer.from_buffers("lines", [(arc_id, [size], None, False, None) for arc_id, size in enumerate(arc_sizes)],
+                                       coords[:offset * 2], zoom_culling=False, min_scales=arc_scales)
+    return layer
+
+
+def is_current(path):
+    """True if the .geo file at path was written by this version of the codec."""
+    with open(path, "rb") as f:
+        header = f.read(5)
+    return header[:4] == MAGIC and header[4] == VERSION
+
+
+def encoded_path(path):
+    """maps/Low_quality/rivers.json -> maps/Low_quality/rivers.geo"""
+    return path[:-len(".json")] + ".geo"
+
+
+def build_all():
+    """Encode every layer of every quality and report sizes and decode speed against the JSON."""
+    for quality in QUALITIES:
+        for key in LAYER_KEYS:
+            path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+            if not os.path.exists(path):
+                continue
+            topology_path = current_topology(path, key)
+            source = topology_path or path
+            with open(source, "r") as f:
+                data = json.load(f)
+            raw = encode(key, data, QUANTUM[quality])
+            with open(encoded_path(path), "wb") as f:
+                f.write(raw)
+
+            start = time.perf_counter()
+            with open(source, "rb") as f:
+                if source == topology_path:
+                    MapLayer.from_topology(key, json.loads(f.read()))
+                else:
+                    MapLayer.from_dict(key, json.loads(f.read()))
+            json_time = time.perf_counter() - start
+            start = time.perf_counter()
+            with open(encoded_path(path), "rb") as f:
+                layer = decode(f.read())
+            decode_time = time.perf_counter() - start
+            vertices = len(layer.coords) // 2
+            print(f"{quality}/{LAYER_FILES[key]}: {os.path.getsize(path)} -> {len(raw)} bytes, "
+                  f"load {json_time * 1000:.1f} -> {decode_time * 1000:.1f} ms "
+                  f"({vertices / max(decode_time, 1e-9) / 1e6:.2f} M vertices/s)")
+
+
+if __name__ == "__main__":
+    build_all()
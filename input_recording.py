@@ -0,0 +1,148 @@
+"""
+Recording of play sessions and their deterministic headless replay, for profiling real interaction.
+
+    python main.py --record session.json          # play, the session is saved on exit
+    python replay.py session.json                 # replay it headless and print the frame times
+
+The recorder saves every frame of main(): the events it handled, mouse position and buttons,
+pygame.time.get_ticks() and the seed of the random generator the quizzes draw questions with
+(QuestionScheduler, fill_quiz). The replayer feeds exactly that back to the managers: events come
+from the file, pygame.mouse.get_pos / get_pressed, pygame.key.get_pressed and pygame.time.get_ticks
+are replaced by the recorded state, and every frame waits until the map data it needs is loaded,
+so the managers do the same work as in the recorded session, only as fast as possible.
+Work with a time budget per frame (progressive map refinement) may still be split over the frames
+differently, the frames after it has finished are identical.
+"""
+import asyncio
+import json
+import random
+import time
+
+import pygame
+
+VERSION = 1
+EVENT_VALUES = (bool, int, float, str, type(None))
+
+
+def event_to_json(event):
+    """[type, attributes] of an event, attributes that can not be saved (window objects) are left out."""
+    values = {}
+    for name, value in event.dict.items():
+        if isinstance(value, EVENT_VALUES):
+            values[name] = value
+        elif isinstance(value, (tuple, list)) and all(isinstance(item, EVENT_VALUES) for item in value):
+            values[name] = list(value)
+    return [event.type, values]
+
+
+def event_from_json(data):
+    event_type, values = data
+    return pygame.event.Event(event_type, {name: tuple(value) if isinstance(value, list) else value for name, value in values.items()})
+
+
+class InputRecorder:
+    """Saves the input of every frame of main() to path (written by close)."""
+
+    def __init__(self, path, size, seed=None):
+        self.path = path
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.size = list(size)
+        self.frames = []
+
+    def frame(self, events):
+        """Record the events of a frame with the mouse state and ticks, returns the events."""
+        self.frames.append({"ticks": pygame.time.get_ticks(),
+                            "mouse": list(pygame.mouse.get_pos()),
+                            "buttons": [int(button) for button in pygame.mouse.get_pressed()],
+                            "events": [event_to_json(event) for event in events]})
+        return events
+
+    async def wait(self, scheduler, loader):
+        await scheduler.wait()
+
+    def close(self):
+        with open(self.path, "w") as f:
+            json.dump({"version": VERSION, "seed": self.seed, "size": self.size, "frames": self.frames}, f, separators=(",", ":"))
+
+
+class KeyState:
+    """Stand-in for the result of pygame.key.get_pressed(), indexed by key constants."""
+
+    def __init__(self, pressed):
+        self.pressed = pressed
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class InputReplayer:
+    """
+    Plays a recorded session back into main(), collects the time every frame took (frame_times, seconds).
+    Call install() before main() runs, restore() puts the pygame functions back.
+    """
+
+    def __init__(self, path):
+        with open(path, "r") as f:
+            session = json.load(f)
+        if session.get("version") != VERSION:
+            raise ValueError(f"{path}: unsupported session version {session.get('version')}")
+        self.seed = session["seed"]
+        self.size = tuple(session["size"])
+        self.frames = session["frames"]
+        self.index = -1
+        self.current = None
+        self.keys = set()  # keys held down, followed from the recorded KEYDOWN / KEYUP events
+        self.frame_start = None
+        self.frame_times = []
+        self.originals = None
+
+    def install(self):
+        self.originals = (pygame.mouse.get_pos, pygame.mouse.get_pressed, pygame.key.get_pressed, pygame.time.get_ticks)
+        pygame.mouse.get_pos = lambda: tuple(self.current["mouse"])
+        pygame.mouse.get_pressed = lambda num_buttons=3: tuple(bool(button) for button in self.current["buttons"])
+        pygame.key.get_pressed = lambda: KeyState(self.keys)
+        pygame.time.get_ticks = lambda: self.current["ticks"]
+
+    def restore(self):
+        if self.originals is not None:
+            pygame.mouse.get_pos, pygame.mouse.get_pressed, pygame.key.get_pressed, pygame.time.get_ticks = self.originals
+            self.originals = None
+
+    def frame(self, events):
+        """The recorded events of the next frame (the real ones are dropped), None after the last frame."""
+        self.index += 1
+        if self.index >= len(self.frames):
+            return None
+        self.current = self.frames[self.index]
+        self.frame_start = time.perf_counter()
+        events = [event_from_json(data) for data in self.current["events"]]
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                self.keys.add(event.key)
+            elif event.type == pygame.KEYUP:
+                self.keys.discard(event.key)
+        return events
+
+    async def wait(self, scheduler, loader):
+        """End the frame without waiting for the frame rate, then let the map data of the frame finish loading."""
+        self.frame_times.append(time.perf_counter() - self.frame_start)
+        scheduler.start_wait()
+        await asyncio.sleep(0)
+        while not loader.done():
+            await asyncio.sleep(0.001)
+
+    def close(self):
+        self.restore()
+
+    def report(self):
+        """Summary of the frame times in milliseconds."""
+        times = sorted(seconds * 1000 for seconds in self.frame_times)
+        if not times:
+            return {"frames": 0}
+        return {"frames": len(times),
+                "total": sum(times),
+                "mean": sum(times) / len(times),
+                "median": times[len(times) // 2],
+                "p95": times[min(len(times) - 1, int(len(times) * 0.95))],
+                "p99": times[min(len(times) - 1, int(len(times) * 0.99))],
+                "max": times[-1]}
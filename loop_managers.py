@@ -1,211 +1,31 @@
 import json
+import math
 import os
-import random
-from collections import defaultdict  # co to dela??
+import time
 
 import pygame
-from typing import List, Tuple
 
-Point = Tuple[float, float]
-Polygon = List[Point]
+from answer_matcher import get_answer_matcher
+from area_of_interest import items_bbox
+from fonts import get_font
+from frame_preparer import PREPARE, VERTEX_BYTES, FramePreparer, View, frame_key, scale_bbox, scale_coords
+from frame_scheduler import ACTIVE_FPS
+from geometry import box_overlap_percent, circle_point_collision, circle_polygon_collision, circle_polyline_collision, clip_polygon_to_screen
+from map_layer import LAYER_KEYS, QUALITY_SCALES
+from markers import MARKER_BATCH, marker_blits
+from picking import PickBuffer
+from question_scheduler import QuestionScheduler
+from sqlite_store import GeometryStore, store_is_current
+from term_catalog import add_term, main_bbox, term_info, term_qualities
+from thumbnails import load_thumbnail
+
+AOI_FILL = 0.8  # part of the screen the region of a learning set fills at the start of a quiz
+AOI_MIN_SIZE = 5  # map units
+ZOOM_SPEED = 0.35  # part of the remaining zoom (in log scale) done every frame
+ZOOM_SNAP = 0.01  # log scale distance where the zoom animation ends
+REFINE_BUDGET = 0.008  # seconds per frame spent on a Medium / High quality render at most, see render_map
+FRAME_BUDGET = 1 / ACTIVE_FPS  # seconds of a frame, the refinement only takes what the rest of the frame leaves
 
-def clip_polygon_to_screen(polygon: Polygon, screen_width: float, screen_height: float) -> Polygon:
-    """
-    Clips a polygon to the rectangle [0, screen_width] x [0, screen_height]
-    using the Sutherland–Hodgman polygon clipping algorithm.
-    Automatically removes crossing lines across the screen edges.
-    """
-    def inside(p: Point, edge: str) -> bool:
-        x, y = p
-        if edge == "left": return x >= 0
-        if edge == "right": return x <= screen_width
-        if edge == "bottom": return y >= 0
-        if edge == "top": return y <= screen_height
-        return True
-
-    def intersect(p1: Point, p2: Point, edge: str) -> Point:
-        x1, y1 = p1
-        x2, y2 = p2
-        if x1 == x2 and y1 == y2:
-            return p1
-
-        if edge == "left":
-            x, y = 0, y1 + (y2 - y1) * (0 - x1) / (x2 - x1)
-        elif edge == "right":
-            x, y = screen_width, y1 + (y2 - y1) * (screen_width - x1) / (x2 - x1)
-        elif edge == "bottom":
-            x, y = x1 + (x2 - x1) * (0 - y1) / (y2 - y1), 0
-        elif edge == "top":
-            x, y = x1 + (x2 - x1) * (screen_height - y1) / (y2 - y1), screen_height
-        return (x, y)
-
-    def clip_edge(polygon: Polygon, edge: str) -> Polygon:
-        clipped = []
-        if not polygon:
-            return clipped
-
-        prev_point = polygon[-1]
-        for curr_point in polygon:
-            prev_inside = inside(prev_point, edge)
-            curr_inside = inside(curr_point, edge)
-
-            if curr_inside:
-                if not prev_inside:
-                    clipped.append(intersect(prev_point, curr_point, edge))
-                clipped.append(curr_point)
-            elif prev_inside:
-                clipped.append(intersect(prev_point, curr_point, edge))
-
-            prev_point = curr_point
-        return clipped
-
-    # Clip polygon against all 4 screen edges
-    clipped_poly = polygon[:]
-    for edge in ["left", "right", "bottom", "top"]:
-        clipped_poly = clip_edge(clipped_poly, edge)
-        if not clipped_poly:
-            break
-
-    return clipped_poly
-
-def box_overlap_percent(boxA, boxB, relative_to="A"):
-    """
-    Calculate how much of one box overlaps another, as a percentage.
-
-    Parameters:
-        boxA, boxB: tuples (x1, y1, x2, y2)
-            Each box is defined by top-left (x1, y1) and bottom-right (x2, y2).
-        relative_to: str, optional
-            "A" (default) — overlap as % of boxA area
-            "B" — overlap as % of boxB area
-            "union" — overlap as % of union area
-
-    Returns:
-        float: Overlap percentage (0–100)
-    """
-
-    # Ensure coordinates are ordered correctly
-    x1A, y1A = sorted([boxA[0], boxA[2]]), sorted([boxA[1], boxA[3]])
-    x1B, y1B = sorted([boxB[0], boxB[2]]), sorted([boxB[1], boxB[3]])
-
-    # Compute overlap bounds
-    x_left = max(x1A[0], x1B[0])
-    y_top = max(y1A[0], y1B[0])
-    x_right = min(x1A[1], x1B[1])
-    y_bottom = min(y1A[1], y1B[1])
-
-    # Check for no overlap
-    if x_right <= x_left or y_bottom <= y_top:
-        return 0.0
-
-    # Areas
-    areaA = (x1A[1] - x1A[0]) * (y1A[1] - y1A[0])
-    areaB = (x1B[1] - x1B[0]) * (y1B[1] - y1B[0])
-    intersection = (x_right - x_left) * (y_bottom - y_top)
-    union = areaA + areaB - intersection
-
-    if relative_to == "B":
-        base = areaB
-    elif relative_to == "union":
-        base = union
-    else:
-        base = areaA
-
-    return 100.0 * intersection / base
-
-
-def circle_polygon_collision(circle_center, circle_radius, polygon_points):
-    """
-    Check if a circle intersects a polygon.
-
-    Args:
-        circle_center (tuple): (x, y) of circle center in screen coords
-        circle_radius (float): circle radius
-        polygon_points (list): list of tuples of (x, y) coordinates
-
-    Returns:
-        bool
-    """
-    cx, cy = circle_center
-
-    # --- 2. Check if circle center is inside polygon (ray-casting) ---
-    inside = False
-    n = len(polygon_points)
-    for i in range(n):
-        x1, y1 = polygon_points[i]
-        x2, y2 = polygon_points[(i + 1) % n]
-        if ((y1 > cy) != (y2 > cy)) and \
-                (cx < (x2 - x1) * (cy - y1) / (y2 - y1 + 1e-12) + x1):
-            inside = not inside
-    if inside:
-        return True
-
-    # --- 3. Check distance to polygon edges ---
-    for i in range(n):
-        x1, y1 = polygon_points[i]
-        x2, y2 = polygon_points[(i + 1) % n]
-
-        # Closest point on line segment to circle center
-        dx, dy = x2 - x1, y2 - y1
-        if dx == 0 and dy == 0:  # Degenerate edge
-            dist_sq = (cx - x1) ** 2 + (cy - y1) ** 2
-        else:
-            t = max(0, min(1, ((cx - x1) * dx + (cy - y1) * dy) / (dx * dx + dy * dy)))
-            closest_x = x1 + t * dx
-            closest_y = y1 + t * dy
-            dist_sq = (cx - closest_x) ** 2 + (cy - closest_y) ** 2
-
-        if dist_sq <= circle_radius ** 2:
-            return True
-
-    return False
-
-
-def circle_polyline_collision(circle_center, circle_radius, line_points):
-    """
-    Check if a circle intersects a polyline (open multipoint line).
-
-    Args:
-        circle_center (tuple): (x, y) of circle center in screen coords
-        circle_radius (float): circle radius
-        line_points (list): list of tuples of (x, y) coordinates defining the line
-
-    Returns:
-        bool
-    """
-    cx, cy = circle_center
-    n = len(line_points)
-
-    if n < 2:
-        return False  # Need at least two points to form a line segment
-
-    # Check distance to each line segment
-    for i in range(n - 1):
-        x1, y1 = line_points[i]
-        x2, y2 = line_points[i + 1]
-
-        dx, dy = x2 - x1, y2 - y1
-        if dx == 0 and dy == 0:  # Degenerate segment (single point)
-            dist_sq = (cx - x1) ** 2 + (cy - y1) ** 2
-        else:
-            # Projection factor clamped to [0,1]
-            t = max(0, min(1, ((cx - x1) * dx + (cy - y1) * dy) / (dx * dx + dy * dy)))
-            closest_x = x1 + t * dx
-            closest_y = y1 + t * dy
-            dist_sq = (cx - closest_x) ** 2 + (cy - closest_y) ** 2
-
-        if dist_sq <= circle_radius ** 2:
-            return True
-
-    return False
-
-
-def circle_point_collision(circle_center, circle_radius, point_pos):
-    dist_sqrt = (circle_center[0] - point_pos[0]) ** 2 + (circle_center[1] - point_pos[1]) ** 2
-
-    if dist_sqrt <= circle_radius ** 2:
-        return True
-    return False
 
 def preprocess_map_data(map_data):
     """
@@ -220,10 +40,18 @@ def preprocess_map_data(map_data):
 
 
 class MenuLoopManager:
-    def __init__(self, screen):
+    def __init__(self, screen, loader=None):
         self.button_height = 70
         self.screen = screen
-        self.maps = [QuizButton(i.replace(".json", ""), json.load(open(f"maps/learning_sets/{i}", 'r'))["Continent"], json.load(open(f"maps/learning_sets/{i}", 'r'))["items"], self.button_height) for i in os.listdir("maps/learning_sets")]
+        self.loader = loader  # DataLoader / BundleStreamer still loading the maps, None if everything is loaded
+        self.font = get_font("monospace", 20)
+        self.maps = []
+        for i in os.listdir("maps/learning_sets"):
+            with open(f"maps/learning_sets/{i}", 'rb') as f:
+                raw = f.read()
+            learning_set = json.loads(raw)
+            # rendered offline by thumbnails.py, None if it is missing or outdated
+            self.maps.append(QuizButton(i.replace(".json", ""), learning_set["Continent"], learning_set["items"], self.button_height, load_thumbnail(raw)))
         self.active = True
         self.new_b = NewButton()
         self.items_width = 300
@@ -257,9 +85,19 @@ class MenuLoopManager:
         
         pygame.draw.rect(self.screen, (0, 0, 0), (self.items_width, 0, 30, self.screen.get_height() - self.new_b.height), 4)  # sets up the scrollbar
 
+        # loading progress of the map data
+        if self.loader is not None and not self.loader.done():
+            progress = self.loader.progress()
+            loading_text = self.font.render("načítání map: " + str(int(progress * 100)) + " %", True, (0, 0, 0))
+            self.screen.blit(loading_text, (self.items_width + 50, 20))
+            pygame.draw.rect(self.screen, (200, 40, 40), (self.items_width + 50, 30 + loading_text.get_height(), 300 * progress, 20))
+            pygame.draw.rect(self.screen, (0, 0, 0), (self.items_width + 50, 30 + loading_text.get_height(), 300, 20), 2)
+
         y = - y_offset  # start drawing from the scroll position
         # draw the premade quizzes
         for button in self.maps:
+            if not button.ready and (self.loader is None or self.loader.ready_for(button.item_list)):
+                button.ready = True  # everything the quiz needs is loaded
             if not button.draw(self.screen, y, self.items_width) and self.ignore_first_click:  # false if the button was pressed
                 self.active = False
 
@@ -282,36 +120,60 @@ class MenuLoopManager:
 
 
 class QuizLoopManager:
-    def __init__(self, screen, world_map_h, world_map_m, world_map_s, quiz_info):
+    def __init__(self, screen, world_map_h, world_map_m, world_map_s, quiz_info, spaced_repetition=False, memory=None, rng=None):
         self.screen = screen
+        self.memory = memory  # MemoryManager keeping the map data under budget, None keeps everything
         self.screen_offset = [0, 0]
         self.draw_surface = pygame.Surface((self.screen.get_width(), self.screen.get_height()))
         self.map_data = [world_map_s, world_map_m, world_map_h]
         self.map_index = 0
+        self.quality_scales = QUALITY_SCALES  # scale where Medium and High quality start
+        self.preparer = FramePreparer()
+        self.pick_buffer = PickBuffer()  # feature under the mouse, redrawn with the prepared frame
         self.items = quiz_info
+        self.scheduler = QuestionScheduler(self.items or {}, spaced=spaced_repetition, rng=rng)  # rng - seeded by recorded sessions
         self.active = True
         self.position = [1500, 0]
         self.scale = 7
         self.MAX_SCALE = 300  # Maximum scale factor
         self.MIN_SCALE = 5  # Minimum scale factor
         self.SCALE_STEP = 1.4  # Scale step for zooming in and out
+        self.target_scale = None  # zoom animation target, None when not zooming
+        self.target_position = None
+        self.zoom_anchor = None  # surface point staying in place while zooming (the mouse)
+        self.base_surface = None  # last full render of the map, scaled while the view moves
+        self.base_key = None  # frame_key of the frame drawn into base_surface
+        self.base_frame = None
+        self.base_view = None
+        self.refine = None  # generator drawing the detailed frame in time slices
+        self.refine_key = None
+        self.shown_key = None  # base_key of the render drawn in the last frame
+        self.frame_start = time.perf_counter()  # start of the current frame, see step_refine
+        self.refine_end = None
+        self.rest_time = 0  # seconds the last frame took after the refinement (UI, until schedule)
+        self.last_view = None
+        self.moving = False
         self.mouse_pos = None
         self.original_map_size = [400, 400]  # 0, 0 is in the middle of the map
         self.mode = 1
         self.mode_names = ["mód: klikni na", "mód: pojmenuj", "mód: kvíz"]
         self.mode_clicked = False
         # for mode 1 and on
-        self.font = pygame.font.SysFont("Arial", 30)
+        self.font = get_font("Arial", 30)
         self.tested_place = None
         self.looked_at_polygons = []
         self.previous_term = None
         self.highlight_until = pygame.time.get_ticks() + 1000  # example wil expire after 1s
+        self.highlight_cache = {}  # (layer, name) -> screen shapes for highlight_view
+        self.highlight_view = None
         self.clicked_color = (50, 200, 50)
         self.clicked = False
         # for mode 2
         self.input_capture = InputCapture()
         self.text_surface = self.font.render(self.input_capture.get_text(), True, (0, 0, 0))
         self.background_color = (150, 150, 170)
+        self.matcher = get_answer_matcher()
+        self.hint_surface = None
         # for mode 3
         self.answer_surface = pygame.Surface((self.screen.get_width(), self.screen.get_height()), pygame.SRCALPHA)
         self.highlight_surface = pygame.Surface((self.screen.get_width(), self.screen.get_height()), pygame.SRCALPHA)
@@ -335,6 +197,39 @@ class QuizLoopManager:
             (0, 128, 128),    # teal
             (176, 196, 222),  # light steel blue
         )
+        if self.items:
+            self.frame_items()
+
+    def frame_items(self):
+        """
+        Start on the region of the learning set instead of the whole world and pre-warm
+        the geometry, picking and highlight caches of that view, so the first frames reuse them.
+        """
+        bbox = items_bbox(self.items, self.term_bbox)
+        if bbox is None:
+            return
+        screen_w, screen_h = self.screen.get_size()
+        # at least AOI_MIN_SIZE map units, a single city is not shown at maximum zoom
+        width = max(bbox[2] - bbox[0], AOI_MIN_SIZE)
+        height = max(bbox[3] - bbox[1], AOI_MIN_SIZE)
+        self.scale = max(self.MIN_SCALE, min(self.MAX_SCALE, AOI_FILL * min(screen_w / width, screen_h / height)))
+        center_x, center_y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+        self.position = [screen_w / 2 - center_x * self.scale, screen_h / 2 + center_y * self.scale]
+        self.clamp_position()
+
+        self.update_map_index()
+        self.pick((0, 0))  # prepares the frame and draws the picking buffer
+        for key, names in self.items.items():
+            for name in names:
+                self.get_term_shapes([key, name])
+
+    def term_bbox(self, key, name):
+        """Bbox of the main parts of a term from the loaded layers, for terms missing in the term catalog (or if it is not built)."""
+        for layers in self.map_data:
+            layer = layers.get(key)
+            if layer is not None and name in layer:
+                return main_bbox([layer.part_bbox(part) for part in layer.term_parts(name)])
+        return None
 
     def __bool__(self):
         return self.active
@@ -344,18 +239,23 @@ class QuizLoopManager:
         # scale changes
         if event.type == pygame.MOUSEWHEEL and pygame.rect.Rect(self.screen_offset, (self.draw_surface.get_width(), self.draw_surface.get_height())).collidepoint(pygame.mouse.get_pos()):
             mouse_x, mouse_y = pygame.mouse.get_pos()[0] - self.screen_offset[0], pygame.mouse.get_pos()[1] - self.screen_offset[1]
-            if event.y > 0 and not self.scale * self.SCALE_STEP > self.MAX_SCALE:  # Zoom in
-                self.position = [
-                    mouse_x - (mouse_x - self.position[0]) * self.SCALE_STEP,
-                    mouse_y - (mouse_y - self.position[1]) * self.SCALE_STEP,
-                ]
-                self.scale *= self.SCALE_STEP
-            elif event.y < 0 and not self.scale / self.SCALE_STEP < self.MIN_SCALE:  # Zoom out
-                self.position = [
-                    mouse_x - (mouse_x - self.position[0]) / self.SCALE_STEP,
-                    mouse_y - (mouse_y - self.position[1]) / self.SCALE_STEP,
-                ]
-                self.scale /= self.SCALE_STEP
+            # steps add up to the running animation, animate() then eases towards the target
+            if self.target_scale is None:
+                scale, position = self.scale, self.position
+            else:
+                scale, position = self.target_scale, self.target_position
+            step = None
+            if event.y > 0 and not scale * self.SCALE_STEP > self.MAX_SCALE:  # Zoom in
+                step = self.SCALE_STEP
+            elif event.y < 0 and not scale / self.SCALE_STEP < self.MIN_SCALE:  # Zoom out
+                step = 1 / self.SCALE_STEP
+            if step is not None:
+                self.target_scale = scale * step
+                self.target_position = self.clamp([
+                    mouse_x - (mouse_x - position[0]) * step,
+                    mouse_y - (mouse_y - position[1]) * step,
+                ], self.target_scale)
+                self.zoom_anchor = (mouse_x, mouse_y)
             self.scaling = True
 
         self.clamp_position()  # to not go out of bounds
@@ -367,6 +267,8 @@ class QuizLoopManager:
             else:
                 diff = (pygame.mouse.get_pos()[0] - self.mouse_pos[0], pygame.mouse.get_pos()[1] - self.mouse_pos[1])
                 self.position = [self.position[0] + diff[0], self.position[1] + diff[1]]
+                if self.target_scale is not None:
+                    self.target_position = self.clamp([self.target_position[0] + diff[0], self.target_position[1] + diff[1]], self.target_scale)
                 self.mouse_pos = pygame.mouse.get_pos()
 
         if not pygame.mouse.get_pressed()[2]:
@@ -383,95 +285,58 @@ class QuizLoopManager:
             self.highlight_surface.set_alpha(100)
 
     def update(self, screen):
+        self.frame_start = time.perf_counter()
+        self.preparer.hold()  # released when the main loop waits for the next frame, see schedule
 
         # clear the draw surface
         self.draw_surface.fill((100, 100, 255))
         self.highlight_surface.fill((0, 0, 0, 0))
 
-        # change polygon qualyty based on zoom
-        if self.scale < 10:
-            self.map_index = 0
-        elif self.scale < 120:
-            self.map_index = 1
-        else:
-            self.map_index = 2
-
-
-        # draw all polygons
-        for scaled_polygon, name in self.get_visible_polygons():
-            pygame.draw.polygon(self.draw_surface, (100, 155, 100), scaled_polygon)
-            pygame.draw.aalines(self.draw_surface, (0, 0, 0), False, scaled_polygon)
-
-        # draw all lines
-        for scaled_polygon, name in self.get_visible_lines():
-            pygame.draw.aalines(self.draw_surface, (60, 60, 200), False, scaled_polygon)
-
-        # draw all body's of water
-        for scaled_polygon, name in self.get_visible_water_bodeys():
-            pygame.draw.polygon(self.draw_surface, (60, 60, 220), scaled_polygon)
-
-        # draw all cities/points
-        for scaled_point, name, rank, capital in self.get_visible_points():
-            if capital:
-                pygame.draw.circle(self.draw_surface, (209, 49, 245), scaled_point, 2 + self.map_index * 1.5)
-            else:
-                pygame.draw.circle(self.draw_surface, (0, 0, 0), scaled_point, 1 + self.map_index/2)
-
-        for scaled_polygon, name in self.get_visible_custom_polygons():
-            pygame.draw.polygon(self.highlight_surface, (100, 100, 100), scaled_polygon)
-            pygame.draw.aalines(self.draw_surface, (0, 0, 0), False, scaled_polygon)
-
+        self.render_map()
 
         if self.mode == 1:  # tests you with a random place
 
             # highlight clicked place
             if self.previous_term and self.highlight_until > pygame.time.get_ticks():
-                if self.previous_term[0] == "points":
-                    pos = self.map_data[2][self.previous_term[0]][self.previous_term[1]]["geometry"]
-                    pygame.draw.circle(self.draw_surface, self.clicked_color, self.scale_point(pos[0], pos[1]), 5)
-                elif self.previous_term[0] == "lines":
-                    lines = [i["points"] for i in self.map_data[2][self.previous_term[0]][self.previous_term[1]]["geometry"]]
-                    for points in lines:
-                        pygame.draw.lines(self.draw_surface, self.clicked_color, False, self.scale_points(points), 5)
-                else:
-                    lines = [i["points"] for i in self.map_data[2][self.previous_term[0]][self.previous_term[1]]["geometry"]]
-                    for points in lines:
-                        pygame.draw.polygon(self.draw_surface, self.clicked_color, self.scale_points(points))
+                self.draw_term(self.draw_surface, self.previous_term, self.clicked_color, width=5)
 
             # draw name of the tested place
             if self.tested_place is None:
-                key = random.choice(list(self.items.keys()))
-                while not len(self.items[key]):
-                    key = random.choice(list(self.items.keys()))
-                self.tested_place = [key, random.choice(self.items[key])]
-            text_surface = self.font.render(self.tested_place[1], True, (0, 0, 0), (255, 255, 255))
-            self.draw_surface.blit(text_surface, (self.draw_surface.get_width()/2 - text_surface.get_width()/2, 0))
-
-            # check if the tested place is pressed
-            if pygame.mouse.get_pressed()[0] and not self.clicked:
-                clicked = False
-                self.clicked = True
-                if self.tested_place[0] == "points":
-                    pos = self.map_data[2][self.tested_place[0]][self.tested_place[1]]["geometry"]
-                    if circle_point_collision(pygame.mouse.get_pos(), 10, self.scale_point(pos[0], pos[1])):
-                        clicked = True
-                elif self.tested_place[0] == "lines":
-                    for i in self.map_data[2][self.tested_place[0]][self.tested_place[1]]["geometry"]:
-                        if circle_polyline_collision(pygame.mouse.get_pos(), 10, self.scale_points(i["points"])):
-                            clicked = True
-                else:
-                    for i in self.map_data[2][self.tested_place[0]][self.tested_place[1]]["geometry"]:
-                        if circle_polygon_collision(pygame.mouse.get_pos(), 10, self.scale_points(i["points"])):
-                            clicked = True
+                self.tested_place = self.scheduler.draw()
+            if self.tested_place:
+                text_surface = self.font.render(self.tested_place[1], True, (0, 0, 0), (255, 255, 255))
+                self.draw_surface.blit(text_surface, (self.draw_surface.get_width()/2 - text_surface.get_width()/2, 0))
 
-                self.highlight_until = pygame.time.get_ticks() + 1000
-                self.previous_term = self.tested_place
-                self.tested_place = None
+                # check if the tested place is pressed
+                if pygame.mouse.get_pressed()[0] and not self.clicked:
+                    # one pixel read, the geometry is only tested if another feature covers the place
+                    # or it is not drawn at this zoom (small cities)
+                    clicked = self.pick(pygame.mouse.get_pos()) == self.tested_place
+                    self.clicked = True
+                    if clicked:
+                        pass
+                    elif self.tested_place[0] == "points":
+                        for pos in self.get_term_shapes(self.tested_place):
+                            if circle_point_collision(pygame.mouse.get_pos(), 10, pos):
+                                clicked = True
+                    elif self.tested_place[0] == "lines":
+                        for points in self.get_term_shapes(self.tested_place):
+                            if circle_polyline_collision(pygame.mouse.get_pos(), 10, points):
+                                clicked = True
+                    else:
+                        for points in self.get_term_shapes(self.tested_place):
+                            if circle_polygon_collision(pygame.mouse.get_pos(), 10, points):
+                                clicked = True
 
-                if clicked:
-                    self.clicked_color = (50, 200, 50)
-                else:
-                    self.clicked_color = (200, 60, 60)
+                    self.highlight_until = pygame.time.get_ticks() + 1000
+                    self.scheduler.record(self.tested_place, clicked)
+                    self.previous_term = self.tested_place
+                    self.tested_place = None
+
+                    if clicked:
+                        self.clicked_color = (50, 200, 50)
+                    else:
+                        self.clicked_color = (200, 60, 60)
 
             # reset mouse pressing
             if not pygame.mouse.get_pressed()[0]:
@@ -480,26 +345,11 @@ class QuizLoopManager:
         if self.mode == 2:
             # tests you on the name of the place
             if self.tested_place is None:
-                key = random.choice(list(self.items.keys()))
-                while not len(self.items[key]):
-                    key = random.choice(list(self.items.keys()))
-                self.tested_place = [key, random.choice(self.items[key])]
+                self.tested_place = self.scheduler.draw()
 
             # highlight the tested place
             if self.tested_place:
-                if self.tested_place[0] == "points":
-                    pos = self.map_data[2][self.tested_place[0]][self.tested_place[1]]["geometry"]
-                    pygame.draw.circle(self.draw_surface, (50, 70, 150), self.scale_point(pos[0], pos[1]), 5)
-                elif self.tested_place[0] == "lines":
-                    lines = [i["points"] for i in
-                             self.map_data[2][self.tested_place[0]][self.tested_place[1]]["geometry"]]
-                    for points in lines:
-                        pygame.draw.lines(self.draw_surface, (50, 70, 150), False, self.scale_points(points), 5)
-                else:
-                    lines = [i["points"] for i in
-                             self.map_data[2][self.tested_place[0]][self.tested_place[1]]["geometry"]]
-                    for points in lines:
-                        pygame.draw.polygon(self.draw_surface, (50, 70, 150), self.scale_points(points))
+                self.draw_term(self.draw_surface, self.tested_place, (50, 70, 150), width=5)
 
             # draw the text box
             if self.text_surface.get_width() < 150:
@@ -512,22 +362,35 @@ class QuizLoopManager:
             self.draw_surface.blit(self.text_surface, (self.draw_surface.get_width()/2 - self.text_surface.get_width()/2, 0))
 
             # check result after enter is pressed
-            if pygame.key.get_pressed()[pygame.K_RETURN] and not self.clicked:
+            if pygame.key.get_pressed()[pygame.K_RETURN] and not self.clicked and self.tested_place:
                 self.clicked = True
                 text = self.input_capture.get_text()
                 self.input_capture.activate()
 
-                if text.lower() == self.tested_place[1].lower():
+                if self.matcher.is_correct(text, self.tested_place[1]):
+                    self.scheduler.record(self.tested_place, True)
                     self.tested_place = None
                     self.background_color = (50, 200, 50)
                     self.highlight_until = pygame.time.get_ticks() + 1000
+                    self.hint_surface = None
                 else:
+                    self.scheduler.record(self.tested_place, False)
+                    suggestion = self.matcher.suggestion(text)
+                    if suggestion:
+                        self.hint_surface = self.font.render("myslel jsi " + suggestion + "?", True, (0, 0, 0), (255, 255, 255))
+                    else:
+                        self.hint_surface = None
                     self.tested_place = None
                     self.background_color = (200, 60, 60)
                     self.highlight_until = pygame.time.get_ticks() + 1000
 
             if self.highlight_until < pygame.time.get_ticks():
                 self.background_color = (150, 150, 170)
+                self.hint_surface = None
+
+            # draw the "did you mean" hint under the text box
+            if self.hint_surface:
+                self.draw_surface.blit(self.hint_surface, (self.draw_surface.get_width()/2 - self.hint_surface.get_width()/2, self.text_surface.get_height() + 5))
 
             if not pygame.key.get_pressed()[pygame.K_RETURN]:
                 self.clicked = False
@@ -535,11 +398,6 @@ class QuizLoopManager:
         if self.mode == 3:  # quiz simulation
             screen.fill((160, 160, 170))
 
-            # Build lookup: name -> list of polygons for drawing
-            visible_polygons = defaultdict(list)
-            for polygon, name in self.get_visible_polygons():
-                visible_polygons[name].append(polygon)
-
             # first 5 questions - find the place
             for i in range(5):
 
@@ -562,37 +420,20 @@ class QuizLoopManager:
 
                 pygame.draw.rect(screen, color, ((screen.get_width() - 380, self.button_begin_point + 60 * i), (300, 50)), 4)
 
+            # outline the place under the mouse while choosing one
+            if self.selected_place is not None and self.selected_place < 5 and not self.moving and pygame.mouse.get_pos()[0] < (screen.get_width() - 400) and pygame.mouse.get_pos()[1] > 100:
+                hovered = self.pick((pygame.mouse.get_pos()[0] - self.screen_offset[0], pygame.mouse.get_pos()[1] - self.screen_offset[1]))
+                if hovered:
+                    self.draw_term(self.draw_surface, hovered, self.outlines_colors[1], radius=7, width=3, outline=True)
+
             # select place for correct button
             if self.selected_place is not None and self.selected_place < 5 and pygame.mouse.get_pressed()[0] and pygame.mouse.get_pos()[0] < (screen.get_width() - 400) and pygame.mouse.get_pos()[1] > 100:
                 mouse_pos = list(pygame.mouse.get_pos())
                 mouse_pos[0] -= self.screen_offset[0]
                 mouse_pos[1] -= self.screen_offset[1]
-                intersect_list = []
-                for pos, name, _, _ in self.get_visible_points():
-                    if circle_point_collision(mouse_pos, 10, pos):
-                        intersect_list.append({"points": name})
-                for line, name in self.get_visible_lines():
-                    if circle_polyline_collision(mouse_pos, 10, line):
-                        intersect_list.append({"lines": name})
-                for pol, name in self.get_visible_water_bodeys():
-                    if circle_polygon_collision(mouse_pos, 10, pol):
-                        intersect_list.append({"blue_polygons": name})
-                for pol, name in self.get_visible_custom_polygons():
-                    if circle_polygon_collision(mouse_pos, 10, pol):
-                        intersect_list.append({"new_polygons": name})
-                for pol, name in self.get_visible_polygons():
-                    if circle_polygon_collision(mouse_pos, 10, pol):
-                        intersect_list.append({"polygons": name})
-                if intersect_list:
-                    item = intersect_list[0]
-                    self.answered_places[self.selected_place] = [list(item.keys())[0], list(item.values())[0]]
-                    # owerides the random stuff
-
-                    # doesnt work fix
-                    for i in intersect_list:
-                        if i in self.tested_places:
-                            self.answered_places[self.selected_place] = [list(i.keys())[0], list(i.values())[0]]
-                            break
+                picked = self.pick(mouse_pos)
+                if picked:
+                    self.answered_places[self.selected_place] = list(picked)
 
 
             # last 5 questions type the name of the selected state
@@ -629,59 +470,16 @@ class QuizLoopManager:
             for i, place in enumerate(self.tested_places):
                 if i < 5:
                     continue
-                if place[0] == "points":
-                    pos = self.map_data[2][place[0]][place[1]]["geometry"]
-                    pygame.draw.circle(self.highlight_surface, self.selected_colors[i], self.scale_point(pos[0], pos[1]), 5)
-                elif place[0] == "lines":
-                    lines = [i["points"] for i in
-                             self.map_data[2][place[0]][place[1]]["geometry"]]
-                    for points in lines:
-                            pygame.draw.lines(self.highlight_surface, self.selected_colors[i], False, self.scale_points(points), 4)
-                else:
-                    lines = [i["points"] for i in
-                             self.map_data[2][place[0]][place[1]]["geometry"]]
-                    for points in lines:
-                        if len(points) > 2:
-                            pygame.draw.polygon(self.highlight_surface, self.selected_colors[i], self.scale_points(points))
+                self.draw_term(self.highlight_surface, place, self.selected_colors[i])
                 if i == self.selected_place:
-                    if place[0] == "points":
-                        pos = self.map_data[2][place[0]][place[1]]["geometry"]
-                        pygame.draw.circle(self.draw_surface, "black",
-                                             self.scale_point(pos[0], pos[1]), 7)
-                    else:
-                        lines = [i["points"] for i in
-                                 self.map_data[2][place[0]][place[1]]["geometry"]]
-                        for points in lines:
-                            pygame.draw.lines(self.draw_surface, "black", False,
-                                              self.scale_points(points), 4)
+                    self.draw_term(self.draw_surface, place, "black", radius=7, outline=True)
 
             # Draw selected places with color !!!!!!!! for questions 1-5 for better draw order
             for i, place in enumerate(self.answered_places):
                 if i > 4:
                     break
                 if place:
-                    if place[0] == "points":
-                        pos = self.map_data[2][place[0]][place[1]]["geometry"]
-                        pygame.draw.circle(self.highlight_surface, self.selected_colors[i], self.scale_point(pos[0], pos[1]), 5)
-                    elif place[0] == "lines":
-                        lines = [i["points"] for i in
-                                 self.map_data[2][place[0]][place[1]]["geometry"]]
-                        for points in lines:
-                                pygame.draw.lines(self.highlight_surface, self.selected_colors[i], False, self.scale_points(points), 4)
-                    else:
-                        lines = [i["points"] for i in
-                                 self.map_data[2][place[0]][place[1]]["geometry"]]
-                        boxes = [i["bbox"] for i in
-                                 self.map_data[2][place[0]][place[1]]["geometry"]]
-                        for j, points in enumerate(lines):
-                            if len(points) > 2:
-                                overlap = box_overlap_percent(self.scale_bbox(boxes[j]), [self.screen_offset[0], self.screen_offset[1], self.screen.get_width() + self.screen_offset[0], self.screen.get_height() + self.screen_offset[1]])
-                                if overlap < 10:
-                                    points = clip_polygon_to_screen(self.scale_points(points), self.screen.get_width(), self.screen.get_height() + self.screen_offset[1])
-                                else:
-                                    points = self.scale_points(points)
-                                if len(points) > 3:
-                                    pygame.draw.polygon(self.highlight_surface, self.selected_colors[i], points)
+                    self.draw_term(self.highlight_surface, place, self.selected_colors[i])
 
 
             # the evaulate button
@@ -695,13 +493,17 @@ class QuizLoopManager:
                     pygame.draw.rect(screen, (100, 100, 200), ((10, 10), (195, 45)), 4)
                     self.answer_surface = pygame.Surface((screen.get_width(), screen.get_height()), pygame.SRCALPHA)
                     for i in range(5):
-                        if self.answered_places[i] is not None and self.answered_places[i][1].lower() == self.tested_places[i][1].lower():
+                        correct = self.answered_places[i] is not None and self.answered_places[i][1].lower() == self.tested_places[i][1].lower()
+                        self.scheduler.record(self.tested_places[i], correct)
+                        if correct:
                             pygame.draw.rect(self.answer_surface, (100, 250, 100), ((screen.get_width() - 60, self.button_begin_point + 60 * i), (50, 50)))
                         else:
                             pygame.draw.rect(self.answer_surface, (250, 100, 100), ((screen.get_width() - 60, self.button_begin_point + 60 * i), (50, 50)))
 
                     for i in range(5, 10):
-                        if self.answered_places[i] is not None and self.answered_places[i].lower() == self.tested_places[i][1].lower():
+                        correct = self.answered_places[i] is not None and self.matcher.is_correct(self.answered_places[i], self.tested_places[i][1])
+                        self.scheduler.record(self.tested_places[i], correct)
+                        if correct:
                             pygame.draw.rect(self.answer_surface, (100, 250, 100), ((screen.get_width() - 60, self.button_begin_point + 60 * i + self.second_row_difference), (50, 50)))
                         else:
                             pygame.draw.rect(self.answer_surface, (250, 100, 100), ((screen.get_width() - 60, self.button_begin_point + 60 * i + self.second_row_difference), (50, 50)))
@@ -778,6 +580,105 @@ class QuizLoopManager:
         if self.mode_clicked and not pygame.mouse.get_pressed()[0]:
             self.mode_clicked = False
 
+    def schedule(self, scheduler):
+        """Tell the FrameScheduler what this manager is waiting for."""
+        scheduler.on_wait(self.preparer.release)  # the worker prepares while the loop waits
+        if self.refine_end is not None:
+            self.rest_time = time.perf_counter() - self.refine_end
+            self.refine_end = None
+        if self.moving or self.target_scale is not None or self.refine is not None or self.shown_key != self.base_key:
+            scheduler.busy()  # a render finished after the map was drawn is shown in the next frame
+        if self.highlight_until > pygame.time.get_ticks():
+            scheduler.wake_at(self.highlight_until)  # the highlight disappears on the next frame
+
+    def get_layer(self, key, index=None):
+        """
+        Return the layer for the current map_index (or index), or the closest coarser one
+        if that quality is not loaded (yet) or does not exist. None if nothing is loaded.
+        """
+        if index is None:
+            index = self.map_index
+        if self.memory is not None:
+            self.memory.use_layer(index, key)  # loads it again if it was evicted
+        for index in range(index, -1, -1):
+            layer = self.map_data[index].get(key)
+            if layer is not None and len(layer):  # chunked layers are empty until streamed in
+                return layer
+        return None
+
+    def get_term_layer(self, term):
+        """
+        Return the MapLayer holding a term in the quality matching the current zoom.
+        Falls back to finer and then coarser qualities if the term is missing (custom terms, small cities),
+        the qualities the term catalog knows the term in are tried first.
+        """
+        layer, name = term
+        order = [self.map_index] + [i for i in range(self.map_index + 1, 3)] + [i for i in range(self.map_index - 1, -1, -1)]
+        info = term_info(layer, name)
+        if info is not None:
+            known = term_qualities(info)
+            order = [i for i in order if i in known] + [i for i in order if i not in known]
+        for index in order:
+            data = self.map_data[index].get(layer)
+            if data is not None and name in data:
+                if self.memory is not None:
+                    self.memory.use_layer(index, layer)
+                return data
+        return None
+
+    def get_term_shapes(self, term):
+        """
+        Return the screen shapes of a term for the current view.
+        Points -> list of one scaled point, lines -> list of scaled lines, polygons -> list of scaled polygons
+        clipped to the draw surface. Results are cached until the view changes.
+        """
+        view = (self.map_index, self.scale, self.position[0], self.position[1], self.draw_surface.get_size())
+        if view != self.highlight_view:
+            self.highlight_view = view
+            self.highlight_cache.clear()
+
+        key = (term[0], term[1])
+        if key in self.highlight_cache:
+            return self.highlight_cache[key]
+
+        shapes = []
+        layer = self.get_term_layer(term)
+        surface_w, surface_h = self.draw_surface.get_size()
+        if layer is None:
+            pass
+        elif term[0] == "points":
+            shapes.append(self.scale_point(*layer.point(term[1])))
+        else:
+            for part in layer.term_parts(term[1]):
+                scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = self.scale_bbox(layer.part_bbox(part))
+                # whole part is out of the surface (with a margin for thick lines)
+                if scaled_max_x < -10 or scaled_min_x > surface_w + 10 or scaled_max_y < -10 or scaled_min_y > surface_h + 10:
+                    continue
+                points = self.scale_coords(layer.part_coords(part))
+                if term[0] != "lines":
+                    overlap = box_overlap_percent([0, 0, surface_w, surface_h], [scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y], relative_to="B")
+                    if overlap < 10:
+                        # margin keeps the clipped edges out of sight when drawing outlines
+                        points = clip_polygon_to_screen(points, surface_w, surface_h, margin=10)
+                    if len(points) < 3:
+                        continue
+                elif len(points) < 2:
+                    continue
+                shapes.append(points)
+
+        self.highlight_cache[key] = shapes
+        return shapes
+
+    def draw_term(self, surface, term, color, radius=5, width=4, outline=False):
+        """Draw a highlighted term, polygons are filled unless outline is True."""
+        for shape in self.get_term_shapes(term):
+            if term[0] == "points":
+                pygame.draw.circle(surface, color, shape, radius)
+            elif term[0] == "lines" or outline:
+                pygame.draw.lines(surface, color, False, shape, width)
+            else:
+                pygame.draw.polygon(surface, color, shape)
+
     def scale_point(self, x, y):
         """Scale and translate a single point to screen coordinates."""
         return (x * self.scale + self.position[0],
@@ -787,125 +688,291 @@ class QuizLoopManager:
         """Scale and translate a list of points (polygon/line)."""
         return [self.scale_point(x, y) for x, y in points]
 
+    def scale_coords(self, coords):
+        """Scale and translate a flat x, y sequence (MapLayer part) to a list of screen points."""
+        return scale_coords(coords, self.view())
+
     def scale_bbox(self, bbox):
         """Scale and translate a bounding box (min_x, min_y, max_x, max_y)."""
-        min_x, min_y, max_x, max_y = bbox
-        scaled_min_x = min_x * self.scale + self.position[0]
-        scaled_max_x = max_x * self.scale + self.position[0]
-        scaled_min_y = -max_y * self.scale + self.position[1]  # note: Y flipped
-        scaled_max_y = -min_y * self.scale + self.position[1]
-        return scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y
-
-    def get_visible_polygons(self):
-        screen_w, screen_h = self.screen.get_size()
-
-        for name, data in self.map_data[self.map_index]["polygons"].items():
-            for poly in data["geometry"]:
-                scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = self.scale_bbox(poly["bbox"])
-
-                # Quick reject: check if bbox overlaps screen
-                if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
-                    continue
-
-                # Too small after scaling
-                if (scaled_max_x - scaled_min_x) < 2 or (scaled_max_y - scaled_min_y) < 2:
-                    continue
-
-
-                scaled_polygon = self.scale_points(poly["points"])
-                if len(scaled_polygon) > 30:
-                    overlapp = box_overlap_percent([0, 0, screen_w, screen_h], [scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y], relative_to="B")
-                    if overlapp < 10:
-                        scaled_polygon = clip_polygon_to_screen(polygon=scaled_polygon, screen_width=screen_w, screen_height=screen_h)
-
-                    if len(scaled_polygon) < 3:
-                        continue
-
-                yield scaled_polygon, name
-
-    def get_visible_lines(self):
-        screen_w, screen_h = self.screen.get_size()
-
-        for name, data in self.map_data[self.map_index]["lines"].items():
-            for line in data["geometry"]:
-                scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = self.scale_bbox(line["bbox"])
+        return scale_bbox(bbox, self.view())
 
-                if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
-                    continue
-
-                scaled_line = self.scale_points(line["points"])
-                yield scaled_line, name
+    def update_map_index(self):
+        """Pick the map quality for the current zoom."""
+        if self.scale < self.quality_scales[0]:
+            self.map_index = 0
+        elif self.scale < self.quality_scales[1]:
+            self.map_index = 1
+        else:
+            self.map_index = 2
 
-    def get_visible_water_bodeys(self):
+    def view(self):
         screen_w, screen_h = self.screen.get_size()
+        return View(self.map_index, self.scale, self.position[0], self.position[1], screen_w, screen_h)
 
-        for name, data in self.map_data[self.map_index]["blue_polygons"].items():
-            for poly in data["geometry"]:
-                scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = self.scale_bbox(poly["bbox"])
-
-                if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
-                    continue
-
-                if (scaled_max_x - scaled_min_x) < 2 or (scaled_max_y - scaled_min_y) < 2:
-                    continue
-
-                scaled_polygon = self.scale_points(poly["points"])
-                yield scaled_polygon, name
-
-    def get_visible_points(self):
+    def world_view(self):
+        """(map_index, (min_x, min_y, max_x, max_y)) of the map area on screen, in map coordinates."""
         screen_w, screen_h = self.screen.get_size()
+        return self.map_index, ((0 - self.position[0]) / self.scale, (self.position[1] - screen_h) / self.scale,
+                                (screen_w - self.position[0]) / self.scale, (self.position[1] - 0) / self.scale)
 
-        for name, data in self.map_data[self.map_index]["points"].items():
-            scaled_x, scaled_y = self.scale_point(*data["geometry"])
-
-            if scaled_x < 0 or scaled_x > screen_w or scaled_y < 0 or scaled_y > screen_h:
-                continue
+    def use_caches(self):
+        """Report the geometry caches to the memory manager, once per frame."""
+        if self.memory is None:
+            return
+        surface_w, surface_h = self.draw_surface.get_size()
+        self.memory.use(("cache", "frame"), self.preparer.nbytes(), self.preparer.clear)
+        self.memory.use(("cache", "pick"), self.pick_buffer.nbytes(), self.pick_buffer.clear)
+        self.memory.use(("cache", "highlight"), VERTEX_BYTES * sum(len(shape) for shapes in self.highlight_cache.values() for shape in shapes), self.highlight_cache.clear)
+        self.memory.use(("cache", "base"), 0 if self.base_surface is None else surface_w * surface_h * 4, self.clear_base)
+
+    def frame_layers(self, index=None):
+        """Layers making up a frame of the current map_index (or index)."""
+        layers = {key: self.get_layer(key, index) for key in LAYER_KEYS}
+        if layers["polygons"] is not None and layers["polygons"].arcs is not None:
+            layers["borders"] = layers["polygons"].arcs  # shared borders are drawn once, not per country
+        return layers
+
+    def prepare_frame(self):
+        """Visible geometry of every layer for the current view, see FramePreparer."""
+        return self.preparer.prepare(self.view(), self.frame_layers())
+
+    def render_map(self):
+        """
+        Draw the map for this frame onto the draw surface.
+
+        The vector map is drawn into base_surface only when the view stands still and the frame
+        changed. While the view moves (zoom animation, dragging) the last full render is scaled and
+        shifted to the new view instead. New frames are drawn progressively: the scaled old render is
+        shown first (Medium and High quality ones start with a Low quality render if that does not cover
+        the screen), the frame is prepared on the worker of FramePreparer (time sliced without it) and
+        drawn over the next frames in what is left of FRAME_BUDGET, REFINE_BUDGET at most.
+        Only the very first frame is drawn at once, in Low quality.
+        """
+        self.animate()
+        self.update_map_index()
+        view = self.view()
+        self.moving = view != self.last_view and self.last_view is not None
+        self.last_view = view
+        self.use_caches()
+        layers = self.frame_layers()  # also marks the layers as used while moving
+        base_ready = self.base_surface is not None and self.base_surface.get_size() == self.draw_surface.get_size()
+
+        if self.moving and base_ready:
+            self.refine = None
+            self.draw_moving_map(view)
+            return
 
-            # reject if city has low importance
-            if self.map_index == 0 and not data["capital"] and data["rank"] < 9:
-                continue
-            if self.map_index == 1 and not data["capital"] and data["rank"] < 8:
+        key = frame_key(view, layers)
+        if key != self.base_key and self.base_surface is None:  # nothing to show yet, a Low quality render is drawn at once
+            coarse_view = view._replace(map_index=0)
+            coarse_layers = self.frame_layers(0)
+            self.set_base(coarse_view, frame_key(coarse_view, coarse_layers), self.preparer.prepare(coarse_view, coarse_layers))
+            base_ready = True
+
+        # the render shown in this frame is drawn first, the refinement gets the time that is left
+        self.shown_key = self.base_key
+        if self.base_view[1:] == view[1:]:
+            self.draw_surface.blit(self.base_surface, (0, 0))
+            for scaled_polygon, name in self.base_frame["new_polygons"]:
+                pygame.draw.polygon(self.highlight_surface, (100, 100, 100), scaled_polygon)
+        else:
+            self.draw_moving_map(view)
+
+        if key != self.base_key:
+            # a running refinement of the same view is finished first, chunks streamed in meanwhile
+            # are drawn by the next one, so the refined frame is shown even while streaming
+            if self.refine is None or self.refine_key[0] != view:
+                coarse = self.map_index > 0 and not (base_ready and self.base_covers(view))
+                self.refine = self.refine_map(view, layers, key, coarse)
+                self.refine_key = key
+            self.step_refine()
+
+    def set_base(self, view, key, frame, surface=None):
+        """Make frame (drawn into surface, or drawn now) the base render of the map."""
+        if surface is None:
+            surface = self.base_surface
+            if surface is None or surface.get_size() != self.draw_surface.get_size():
+                surface = pygame.Surface(self.draw_surface.get_size())
+            surface.fill((100, 100, 255))
+            self.draw_map(frame, surface)
+        self.base_surface = surface
+        self.base_key = key
+        self.base_frame = frame
+        self.base_view = view
+
+    def refine_map(self, view, layers, key, coarse=False):
+        """
+        Generator preparing and drawing the frame for view into a new surface, one feature per step.
+        With coarse a Low quality render of view is drawn the same way first (the old render does not
+        cover the screen), the worker prepares the detailed frame meanwhile.
+        """
+        if coarse:
+            if self.preparer.threaded and self.preparer.front["key"] != key:
+                self.preparer.submit(key, view, layers)
+            yield from self.coarse_map(view)
+        yield from self.preparer.prepare_steps(view, layers)
+        if self.preparer.front["key"] != key:  # replaced by prepare() in between
+            self.preparer.prepare(view, layers)
+        frame = self.preparer.front["layers"]
+        surface = pygame.Surface(self.draw_surface.get_size())
+        surface.fill((100, 100, 255))
+        yield from self.draw_map_steps(frame, surface)
+        self.set_base(view, key, frame, surface)
+
+    def coarse_map(self, view):
+        """Generator preparing and drawing a Low quality render of view, one feature per step, it becomes the base render."""
+        coarse_view = view._replace(map_index=0)
+        coarse_layers = self.frame_layers(0)
+        frame = {}
+        for name, layer in coarse_layers.items():
+            shapes = frame[name] = []
+            if layer is None:
                 continue
+            for shape in PREPARE[name](layer, coarse_view):
+                shapes.append(shape)
+                yield
+        surface = pygame.Surface(self.draw_surface.get_size())
+        surface.fill((100, 100, 255))
+        yield from self.draw_map_steps(frame, surface)
+        self.set_base(coarse_view, frame_key(coarse_view, coarse_layers), frame, surface)
+
+    def step_refine(self):
+        """
+        Advance the running refinement until it waits for the worker, for REFINE_BUDGET seconds at most
+        and only in what is left of FRAME_BUDGET since update started, without the time the rest of the
+        last frame took (at least one step).
+        """
+        end = min(time.perf_counter() + REFINE_BUDGET, self.frame_start + FRAME_BUDGET - self.rest_time)
+        for waiting in self.refine:
+            if waiting or time.perf_counter() > end:
+                break
+        else:
+            self.refine = None
+        self.refine_end = time.perf_counter()
+
+    def base_covers(self, view):
+        """True if the base render, scaled to view, fills the whole draw surface."""
+        factor = view.scale / self.base_view.scale
+        base_w, base_h = self.base_surface.get_size()
+        surface_w, surface_h = self.draw_surface.get_size()
+        return (self.base_view.x - view.x / factor >= 0 and self.base_view.y - view.y / factor >= 0 and
+                self.base_view.x + (surface_w - view.x) / factor <= base_w and
+                self.base_view.y + (surface_h - view.y) / factor <= base_h)
+
+    def draw_moving_map(self, view):
+        """Draw base_surface scaled and shifted from base_view to view, only the part that ends up on screen is scaled."""
+        factor = view.scale / self.base_view.scale
+        base_w, base_h = self.base_surface.get_size()
+        surface_w, surface_h = self.draw_surface.get_size()
+        # base surface pixels visible in the new view
+        left = max(0, math.floor(self.base_view.x - view.x / factor))
+        top = max(0, math.floor(self.base_view.y - view.y / factor))
+        right = min(base_w, math.ceil(self.base_view.x + (surface_w - view.x) / factor))
+        bottom = min(base_h, math.ceil(self.base_view.y + (surface_h - view.y) / factor))
+        if right <= left or bottom <= top:
+            return
+        size = (max(1, round((right - left) * factor)), max(1, round((bottom - top) * factor)))
+        scaled = pygame.transform.scale(self.base_surface.subsurface((left, top, right - left, bottom - top)), size)
+        self.draw_surface.blit(scaled, (round(view.x + (left - self.base_view.x) * factor),
+                                        round(view.y + (top - self.base_view.y) * factor)))
+
+    def clear_base(self):
+        self.base_surface = None
+        self.base_key = None
+        self.base_frame = None
+        self.refine = None
+
+    def animate(self):
+        """Move the view a part of the way to the zoom target, keeping the point under the mouse in place."""
+        if self.target_scale is None:
+            return
+        ratio = self.target_scale / self.scale
+        if abs(math.log(ratio)) < ZOOM_SNAP:
+            self.scale = self.target_scale
+        else:
+            self.scale *= ratio ** ZOOM_SPEED
+        anchor_x, anchor_y = self.zoom_anchor
+        factor = self.scale / self.target_scale
+        self.position = [anchor_x - (anchor_x - self.target_position[0]) * factor,
+                         anchor_y - (anchor_y - self.target_position[1]) * factor]
+        self.clamp_position()
+        if self.scale == self.target_scale:
+            self.target_scale = None
+            self.target_position = None
+
+    def draw_map(self, frame, surface):
+        for _ in self.draw_map_steps(frame, surface):
+            pass
 
+    def draw_map_steps(self, frame, surface):
+        """Generator drawing the frame onto surface, one feature per step."""
+        # draw all polygons
+        borders = frame.get("borders")
+        for scaled_polygon, name in frame["polygons"]:
+            pygame.draw.polygon(surface, (100, 155, 100), scaled_polygon)
+            if borders is None:
+                pygame.draw.aalines(surface, (0, 0, 0), False, scaled_polygon)
+            yield
+
+        # draw every border once
+        if borders is not None:
+            for scaled_line, arc in borders:
+                pygame.draw.aalines(surface, (0, 0, 0), False, scaled_line)
+                yield
 
-            yield (scaled_x, scaled_y), name, data["rank"], data["capital"]
+        # draw all lines
+        for scaled_polygon, name in frame["lines"]:
+            pygame.draw.aalines(surface, (60, 60, 200), False, scaled_polygon)
+            yield
 
-        screen_w, screen_h = self.screen.get_size()
+        # draw all body's of water
+        for scaled_polygon, name in frame["blue_polygons"]:
+            pygame.draw.polygon(surface, (60, 60, 220), scaled_polygon)
+            yield
+
+        # draw all cities/points, stamped from pre-drawn marker sprites in batches
+        points = frame["points"]
+        for start in range(0, len(points), MARKER_BATCH):
+            surface.blits(marker_blits(points[start:start + MARKER_BATCH], self.map_index), doreturn=False)
+            yield
+
+        # custom polygons are filled on the highlight surface every frame, see render_map
+        for scaled_polygon, name in frame["new_polygons"]:
+            pygame.draw.aalines(surface, (0, 0, 0), False, scaled_polygon)
+            yield
+
+    def pick(self, pos):
+        """Return [layer key, name] of the visible feature at pos (draw surface coordinates) or None."""
+        if self.base_view is not None and self.base_view[1:] == self.view()[1:]:
+            frame, key = self.base_frame, self.base_key  # what is on screen, even if not refined yet
+        else:
+            frame, key = self.prepare_frame(), self.preparer.front["key"]
+        self.pick_buffer.update(key, frame, self.draw_surface.get_size())
+        return self.pick_buffer.pick(pos)
 
-        for name, data in self.map_data[self.map_index]["points"].items():
-            # Scale + translate bbox
-            scaled_x = data["geometry"][0] * self.scale + self.position[0]
-            scaled_y = -data["geometry"][1] * self.scale + self.position[1]  # note: Y flipped
+    def get_visible_polygons(self):
+        return iter(self.prepare_frame()["polygons"])
 
-            # Quick reject: check if bbox overlaps screen
-            if scaled_x < 0 or scaled_x > screen_w or scaled_y < 0 or scaled_y > screen_h:
-                continue
+    def get_visible_lines(self):
+        return iter(self.prepare_frame()["lines"])
 
+    def get_visible_water_bodeys(self):
+        return iter(self.prepare_frame()["blue_polygons"])
 
-            yield (scaled_x, scaled_y), name, data["rank"], data["capital"]
+    def get_visible_points(self):
+        return iter(self.prepare_frame()["points"])
 
     def get_visible_custom_polygons(self):
-        screen_w, screen_h = self.screen.get_size()
-
-        for name, data in self.map_data[self.map_index]["new_polygons"].items():
-            for poly in data["geometry"]:
-                scaled_min_x, scaled_min_y, scaled_max_x, scaled_max_y = self.scale_bbox(poly["bbox"])
-
-                # Quick reject: check if bbox overlaps screen
-                if scaled_max_x < 0 or scaled_min_x > screen_w or scaled_max_y < 0 or scaled_min_y > screen_h:
-                    continue
-
-                # Too small after scaling
-                if (scaled_max_x - scaled_min_x) < 2 or (scaled_max_y - scaled_min_y) < 2:
-                    continue
-
-                scaled_polygon = self.scale_points(poly["points"])
-                yield scaled_polygon, name
+        return iter(self.prepare_frame()["new_polygons"])
 
     def clamp_position(self):
         """Clamp self.position so the map (centered at pos) stays inside screen."""
-        map_width = self.original_map_size[0] * self.scale
-        map_height = self.original_map_size[1] * self.scale
+        self.position = self.clamp(self.position, self.scale)
+
+    def clamp(self, position, scale):
+        """Return position clamped so the map at scale stays inside screen."""
+        map_width = self.original_map_size[0] * scale
+        map_height = self.original_map_size[1] * scale
         screen_width, screen_height = self.screen.get_size()
 
         # Calculate allowed ranges for the map center
@@ -915,8 +982,7 @@ class QuizLoopManager:
         max_y = map_height/2
 
         # Clamp position (map center)
-        self.position[0] = max(min_x, min(self.position[0], max_x))
-        self.position[1] = max(min_y, min(self.position[1], max_y))
+        return [max(min_x, min(position[0], max_x)), max(min_y, min(position[1], max_y))]
 
     def switch_modes(self, mode):
         if mode == 1:
@@ -926,25 +992,16 @@ class QuizLoopManager:
             self.mode = 2
             self.input_capture.activate()
             self.screen_offset = [0, 0]
-        if mode == 3 and len(self.items["polygons"]) + len(self.items["lines"]) + len(self.items["blue_polygons"]) + len(self.items["points"]) < 10:
+        if mode == 3 and len(self.scheduler) < 10:  # not enough distinct places for the quiz
             self.switch_modes(1)
-            pass
-        if mode == 3 and len(self.items["polygons"]) + len(self.items["lines"]) + len(self.items["blue_polygons"]) + len(self.items["points"]) > 9:
+        if mode == 3 and len(self.scheduler) > 9:
             self.mode = 3
             self.screen_offset = [-400, 100]
             self.input_capture.activate()
             self.fill_quiz()
 
     def fill_quiz(self):
-        i = 0
-        while i < 10:
-            key = random.choice(list(self.items.keys()))
-            while not len(self.items[key]):
-                key = random.choice(list(self.items.keys()))
-            choice = [key, random.choice(self.items[key])]
-            if choice not in self.tested_places:
-                self.tested_places[i] = choice
-                i += 1
+        self.tested_places = self.scheduler.sample(10)
         self.answer_text_surfaces = [self.font.render(self.tested_places[0][1], True, (0, 0, 0)), self.font.render(self.tested_places[1][1], True, (0, 0, 0)), self.font.render(self.tested_places[2][1], True, (0, 0, 0)), self.font.render(self.tested_places[3][1], True, (0, 0, 0)), self.font.render(self.tested_places[4][1], True, (0, 0, 0)), [None, ""], [None, ""], [None, ""], [None, ""], [None, ""]]
 
 
@@ -964,8 +1021,8 @@ class CreatorLoopManager:
         self.object_text = ""
         self.input_capture = InputCapture()
         self.input_active = 0
-        self.font = pygame.font.SysFont("monospace", 40)
-        self.object_font = pygame.font.SysFont("monospace", 20)
+        self.font = get_font("monospace", 40)
+        self.object_font = get_font("monospace", 20)
         self.padding = 6
         self.clicked = False
         self.text_offset = 0
@@ -1128,9 +1185,13 @@ class CreatorLoopManager:
             if pygame.mouse.get_pressed()[0]:
                 out = {"Continent": self.continent,
                        "items": self.my_objects}
+                use_store = store_is_current()
                 with open("maps/learning_sets/" + self.name + ".json", "w") as outfile:
                     outfile.write(json.dumps(out))
-                    return False, False
+                if use_store:
+                    with GeometryStore() as store:
+                        store.save_learning_set(self.name, self.continent, self.my_objects)
+                return False, False
 
         else:
             pygame.draw.rect(self.screen, (50, 50, 50), exp_rec, int(thickness / 3) + 1)
@@ -1175,9 +1236,10 @@ class CreatorLoopManager:
 
 
 class Term_Creator_Manager(QuizLoopManager):
-    def __init__(self, screen, world_map_h, world_map_m, world_map_s, quiz_info):
-        QuizLoopManager.__init__(self, screen, world_map_h, world_map_m, world_map_s, quiz_info)
+    def __init__(self, screen, world_map_h, world_map_m, world_map_s, quiz_info, memory=None):
+        QuizLoopManager.__init__(self, screen, world_map_h, world_map_m, world_map_s, quiz_info, memory=memory)
         self.screen_offset = [0, 70]
+        self.quality_scales = (10, 60)
         self.new_term = [[], False]
         self.term_name = ""
         self.input_capture.activate()
@@ -1185,42 +1247,13 @@ class Term_Creator_Manager(QuizLoopManager):
         self.changes = [False, False, False, False, False]
 
     def update(self, screen):
+        self.frame_start = time.perf_counter()
+        self.preparer.hold()
         # clear the draw surface
         self.draw_surface.fill((100, 100, 255))
         self.highlight_surface.fill((0, 0, 0, 0))
 
-        # change polygon qualyty based on zoom
-        if self.scale < 10:
-            self.map_index = 0
-        elif self.scale < 60:
-            self.map_index = 1
-        else:
-            self.map_index = 2
-
-        # draw all polygons
-        for scaled_polygon, name in self.get_visible_polygons():
-            pygame.draw.polygon(self.draw_surface, (100, 155, 100), scaled_polygon)
-            pygame.draw.aalines(self.draw_surface, (0, 0, 0), False, scaled_polygon)
-
-        # draw all lines
-        for scaled_polygon, name in self.get_visible_lines():
-            pygame.draw.aalines(self.draw_surface, (60, 60, 200), False, scaled_polygon)
-
-        # draw all body's of water
-        for scaled_polygon, name in self.get_visible_water_bodeys():
-            pygame.draw.polygon(self.draw_surface, (60, 60, 220), scaled_polygon)
-
-        # draw all cities/points
-        for scaled_point, name, rank, capital in self.get_visible_points():
-            if capital:
-                pygame.draw.circle(self.draw_surface, (209, 49, 245), scaled_point, 2 + self.map_index * 1.5)
-            else:
-                pygame.draw.circle(self.draw_surface, (0, 0, 0), scaled_point, 1 + self.map_index / 2)
-
-        for scaled_polygon, name in self.get_visible_custom_polygons():
-            pygame.draw.polygon(self.highlight_surface, (100, 100, 100), scaled_polygon)
-            pygame.draw.aalines(self.draw_surface, (0, 0, 0), False, scaled_polygon)
-
+        self.render_map()
         # creating a new term logic
         """
         works like this:
@@ -1320,6 +1353,8 @@ class Term_Creator_Manager(QuizLoopManager):
         return (point[0] - self.position[0]) / self.scale, -((point[1] - self.position[1]) / self.scale)
 
     def save_term(self):
+        use_store = store_is_current()  # checked before the JSON files change
+        saved = None  # (layer key, parts, rank) of the new term for the store
         if len(self.new_term[0]) == 1:  # cities
             dict = {"geometry": tuple(self.new_term[0][0]),
                     "rank": 2,
@@ -1338,6 +1373,8 @@ class Term_Creator_Manager(QuizLoopManager):
             data_m[self.term_name] = dict
             data_h[self.term_name] = dict
             data_t["points"].append(self.term_name)
+            get_answer_matcher().add_term(self.term_name)
+            add_term("points", self.term_name, [[self.new_term[0][0]]])
 
             with open("maps/High_quality/cities.json", "w") as h:
                 json.dump(data_h, h, indent=4)
@@ -1349,6 +1386,7 @@ class Term_Creator_Manager(QuizLoopManager):
             with open("maps/terms.json", "w") as t:
                 json.dump(data_t, t)
             self.changes[0] = True
+            saved = ("points", [[self.new_term[0][0]]], 2)
 
         if len(self.new_term[0]) > 1 and self.new_term[1]: # polygons
             self.new_term[0].append(self.new_term[0][0])
@@ -1368,6 +1406,8 @@ class Term_Creator_Manager(QuizLoopManager):
             data_m[self.term_name] = dict
             data_h[self.term_name] = dict
             data_t["new_polygons"].append(self.term_name)
+            get_answer_matcher().add_term(self.term_name)
+            add_term("new_polygons", self.term_name, [self.new_term[0]])
 
             with open("maps/High_quality/custom_polygons.json", "w") as h:
                 json.dump(data_h, h, indent=4)
@@ -1380,6 +1420,7 @@ class Term_Creator_Manager(QuizLoopManager):
                 json.dump(data_t, t)
 
             self.changes[1] = True
+            saved = ("new_polygons", [self.new_term[0]], None)
 
         if len(self.new_term[0]) > 1 and not self.new_term[1]: # lines
 
@@ -1400,6 +1441,8 @@ class Term_Creator_Manager(QuizLoopManager):
             data_m[self.term_name] = dict
             data_h[self.term_name] = dict
             data_t["lines"].append(self.term_name)
+            get_answer_matcher().add_term(self.term_name)
+            add_term("lines", self.term_name, [self.new_term[0]])
 
             with open("maps/High_quality/lines.json", "w") as h:
                 json.dump(data_h, h, indent=4)
@@ -1412,6 +1455,11 @@ class Term_Creator_Manager(QuizLoopManager):
                 json.dump(data_t, t)
 
             self.changes[4] = True
+            saved = ("lines", [self.new_term[0]], None)
+
+        if use_store and saved is not None:
+            with GeometryStore() as store:
+                store.save_term(saved[0], self.term_name, saved[1], saved[2])
 
 class InputCapture:
     def __init__(self):
@@ -1444,19 +1492,26 @@ class InputCapture:
 
 
 class QuizButton:
-    def __init__(self, name, continent, item_l, height):
+    def __init__(self, name, continent, item_l, height, thumbnail=None):
         self.name = name
+        self.thumbnail = thumbnail  # map of the learning set (see thumbnails.py) or None
         self.item_list = item_l
         self.continent = continent
-        self.font = pygame.font.SysFont("monospace", 20)
+        self.font = get_font("monospace", 20)
         self.rect = pygame.Rect(0, 0, 10, height)  # Placeholder for the button rectangle
         self.text_padding = 7  # Padding for the text
+        self.ready = False  # set by MenuLoopManager once the map data of the quiz is loaded
+        # the texts never change, render them once
+        self.name_surface = self.font.render(self.name, True, (0, 0, 0))
+        self.info_surface = self.font.render(self.continent + "     počet: " + str(len(self.item_list)), True, (0, 0, 0))
 
     def draw(self, screen, y, w):
 
         # CHECK IF THE BUTTON IS HOVERED
         mouse_x, mouse_y = pygame.mouse.get_pos()
-        if self.rect.collidepoint(mouse_x, mouse_y):
+        if not self.ready:  # data still loading, cant be started yet
+            pygame.draw.rect(screen, (200, 200, 200), self.rect)
+        elif self.rect.collidepoint(mouse_x, mouse_y):
             pygame.draw.rect(screen, (200, 40, 40), self.rect)
             if pygame.mouse.get_pressed()[0]:  # if the left mouse button is pressed
                 # Here you can add the functionality for starting the quiz
@@ -1464,14 +1519,12 @@ class QuizButton:
         else:
             pygame.draw.rect(screen, (255, 255, 255), self.rect)
 
-        # Render the text
-
-        name_surface = self.font.render(self.name, True, (0, 0, 0))
-        info_surface = self.font.render(self.continent + "     počet: " + str(len(self.item_list)), True, (0, 0, 0))
         self.rect.y = y
         self.rect.width = w
-        screen.blit(name_surface, (10, y + self.text_padding/2))
-        screen.blit(info_surface, (10, y + name_surface.get_height() + self.text_padding))
+        screen.blit(self.name_surface, (10, y + self.text_padding/2))
+        screen.blit(self.info_surface, (10, y + self.name_surface.get_height() + self.text_padding))
+        if self.thumbnail is not None:
+            screen.blit(self.thumbnail, (w - self.thumbnail.get_width() - 5, y + (self.rect.height - self.thumbnail.get_height()) / 2))
         pygame.draw.rect(screen, (0, 0, 0), self.rect, 2)
         return True
 
@@ -1479,7 +1532,7 @@ class QuizButton:
 class NewButton:
     def __init__(self):
         self.text = "Nový kvíz"
-        self.font = pygame.font.SysFont("monospace", 20)
+        self.font = get_font("monospace", 20)
         self.text_surface = self.font.render(self.text, True, (0, 0, 0))
         self.height = 50
         self.rect = pygame.Rect(0, 0, 10, self.height)
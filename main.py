@@ -1,6 +1,14 @@
+import os
 import sys
 import asyncio
+import random
 from loop_managers import *
+from map_layer import load_data
+from bundles import MANIFEST_PATH, BundleStreamer
+from data_loader import DataLoader
+from frame_scheduler import FrameScheduler
+from input_recording import InputRecorder
+from memory_manager import MemoryManager
 # Initialize Pygame
 pygame.init()
 
@@ -18,47 +26,39 @@ WHITE = (255, 255, 255)
 # Clock for controlling the frame rate
 clock = pygame.time.Clock()
 
-def load_data(directory, changes=None, out=None):
-    if out is None:
-        out = {}
-    if changes is None:
-        changes = [True, True, True, True, True]
-    if changes[0]:
-        cities = json.load(open(f"maps/{directory}/cities.json", "r"))
-        out["points"] = cities
-    if changes[1]:
-        custom_polygons = json.load(open(f"maps/{directory}/custom_polygons.json", "r"))
-        out["new_polygons"] = custom_polygons
-    if changes[2]:
-        lakes = json.load(open(f"maps/{directory}/lakes.json", "r"))
-        out["blue_polygons"] = lakes
-    if changes[3]:
-        polygons = json.load(open(f"maps/{directory}/polygons.json", "r"))
-        out["polygons"] = polygons
-    if changes[4]:
-        rivers = json.load(open(f"maps/{directory}/rivers.json", "r"))
-        out["lines"] = rivers
-    return out
-
-
-
 # Main game loop
-async def main():
-
-    # Load stuff
-    map_data_h = load_data("High_quality")
-    map_data_m = load_data("Medium_quality")
-    map_data_s = load_data("Low_quality")
+async def main(session=None):
+    """session - InputRecorder / InputReplayer (input_recording.py) or None to just play"""
+
+    # Load stuff in the background, the menu shows the progress
+    if os.path.exists(MANIFEST_PATH):  # bundles are built (web build) - stream them in while the game runs
+        loader = BundleStreamer(viewport=True)  # Medium / High chunks follow the view
+    else:
+        loader = DataLoader()
+    map_data_s, map_data_m, map_data_h = loader.qualities
+    loading = asyncio.create_task(loader.run())
+    memory = MemoryManager(loader)  # evicts least recently used map data over the budget
+    scheduler = FrameScheduler(clock)  # full frame rate during interaction, idles otherwise
+    rng = random.Random(session.seed) if session else None  # recorded sessions draw the same questions
 
     # settup managers
     Quiz_M = None
-    Menu_M = MenuLoopManager(screen)
+    Menu_M = MenuLoopManager(screen, loader)
     Creator_M = CreatorLoopManager(screen)
     Term_M = None
 
     running = True
     while running:
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        if session:
+            events = session.frame(events)
+            if events is None:  # replayed session is over
+                break
+        scroll = 0
+        for event in events:
+            scheduler.busy()
+            if event.type == pygame.MOUSEWHEEL:
+                scroll = event.y
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.KEYDOWN:
@@ -79,15 +79,16 @@ async def main():
         if Quiz_M:
             Quiz_M.update(screen)
             if not Quiz_M:
-                Menu_M = MenuLoopManager(screen)
+                Menu_M = MenuLoopManager(screen, loader)
 
         if Menu_M:
-            v = Menu_M.update(event.y if event.type == pygame.MOUSEWHEEL else 0)
+            v = Menu_M.update(scroll)
             if v[0] == 1:  # if new quiz button was pressed
                 Creator_M.active = True
                 Menu_M.active = False 
             elif v[0] == 2:  # if quiz button was pressed
-                Quiz_M = QuizLoopManager(screen, map_data_h, map_data_m, map_data_s, v[1])
+                loader.prioritize(v[1])
+                Quiz_M = QuizLoopManager(screen, map_data_h, map_data_m, map_data_s, v[1], memory=memory, rng=rng)
                 Menu_M.active = False
 
         if Term_M:
@@ -106,22 +107,43 @@ async def main():
             if not out[0]:
                 if out[1]:
                     Creator_M.active = False
-                    Term_M = Term_Creator_Manager(screen, map_data_h, map_data_m, map_data_s, None)
+                    Term_M = Term_Creator_Manager(screen, map_data_h, map_data_m, map_data_s, None, memory=memory)
                 else:
                     Creator_M.active = False
-                    Menu_M = MenuLoopManager(screen)
+                    Menu_M = MenuLoopManager(screen, loader)
+
+        # stream chunks near the view, keep the map data under the memory budget
+        for manager in (Quiz_M, Term_M):
+            if manager:
+                loader.set_viewport(*manager.world_view())
+        memory.collect()
+        if loading.done() and not loader.done():
+            loading = asyncio.create_task(loader.run())
+
+        # keep the full frame rate while something is going on
+        if any(pygame.mouse.get_pressed()) or not loader.done():
+            scheduler.busy()
+        for manager in (Quiz_M, Term_M):
+            if manager:
+                manager.schedule(scheduler)
 
         # Update the display
         pygame.display.flip()
 
-        # Cap the frame rate to 60 FPS
-        clock.tick(60)
+        # 60 FPS during interaction, a few when idle (also lets asyncio run)
+        if session:
+            await session.wait(scheduler, loader)
+        else:
+            await scheduler.wait()
 
-        # asyncio
-        await asyncio.sleep(0)
+    if session:
+        session.close()
 
+
+if __name__ == "__main__":
+    session = None
+    if len(sys.argv) > 2 and sys.argv[1] == "--record":
+        session = InputRecorder(sys.argv[2], screen.get_size())
+    asyncio.run(main(session))
     pygame.quit()
     sys.exit()
-
-
-asyncio.run(main())
@@ -0,0 +1,494 @@
+import hashlib
+import json
+import math
+import os
+import weakref
+from array import array
+from bisect import bisect_right
+from itertools import chain
+
+from topology import ring_from_arcs
+
+# key used in the game -> file name in maps/<quality>/
+LAYER_FILES = {"points": "cities",
+               "new_polygons": "custom_polygons",
+               "blue_polygons": "lakes",
+               "polygons": "polygons",
+               "lines": "rivers"}
+# order of the `changes` list returned by Term_Creator_Manager
+LAYER_KEYS = ["points", "new_polygons", "blue_polygons", "polygons", "lines"]
+# index is the map_index used by QuizLoopManager
+QUALITIES = ["Low_quality", "Medium_quality", "High_quality"]
+
+
+def layer_kind(key):
+    """Geometry type of a layer key: "points", "lines" or "polygons"."""
+    if key == "points":
+        return "points"
+    if key == "lines":
+        return "lines"
+    return "polygons"
+
+
+# zoom culling, scale is pixels per map unit (QuizLoopManager.scale, 5 - 300)
+QUALITY_SCALES = (10, 120)  # scale where the quiz switches to Medium and High quality
+MIN_AREA_PX = 2  # polygons whose bbox is thinner than this are not drawn
+MIN_LINE_PX = 8  # lines shorter than this are not drawn
+SCALERANK_BASE = 5  # Natural Earth scalerank n is shown from SCALERANK_BASE * SCALERANK_STEP ** n
+SCALERANK_STEP = 1.4  # one zoom step per rank
+
+
+def part_min_scale(kind, points, bbox, rank=None, capital=False, scalerank=None):
+    """
+    Smallest scale a part is drawn at.
+    points - flat x, y sequence of the part, bbox - its (min_x, min_y, max_x, max_y).
+    Cities by rank (capitals and rank >= 9 always, rank 8 from Medium quality, the rest from High, see QUALITY_SCALES),
+    lines by their length, polygons by the smaller side of their bbox.
+    A Natural Earth scalerank (rivers, lakes) can only raise it.
+    """
+    if kind == "points":
+        if capital or rank is None or rank >= 9:
+            min_scale = 0
+        elif rank >= 8:
+            min_scale = QUALITY_SCALES[0]
+        else:
+            min_scale = QUALITY_SCALES[1]
+    elif kind == "lines":
+        xs, ys = points[0::2], points[1::2]
+        length = sum(map(math.hypot, [b - a for a, b in zip(xs, xs[1:])], [b - a for a, b in zip(ys, ys[1:])]))
+        min_scale = MIN_LINE_PX / length if length else math.inf
+    else:
+        size = min(bbox[2] - bbox[0], bbox[3] - bbox[1])
+        min_scale = MIN_AREA_PX / size if size else math.inf
+    if scalerank is not None:
+        min_scale = max(min_scale, SCALERANK_BASE * SCALERANK_STEP ** scalerank)
+    return min_scale
+
+
+class Feature:
+    """One named map feature, its geometry lives in the MapLayer buffers."""
+    __slots__ = ("id", "name", "first_part", "part_count", "rank", "capital")
+
+    def __init__(self, id, name, first_part, part_count, rank=None, capital=False):
+        self.id = id
+        self.name = name
+        self.first_part = first_part
+        self.part_count = part_count
+        self.rank = rank
+        self.capital = capital
+
+
+class MapLayer:
+    """
+    Compact storage of one layer (cities, rivers, countries...) in one quality.
+
+    All vertices are in one flat array of doubles (x0, y0, x1, y1, ...), every part
+    (ring of a polygon, piece of a river, a city) is a range in it given by offsets.
+    Features only keep the range of their parts, names are looked up through index.
+
+    Replaces the loaded JSON dicts {name: {"geometry": [{"points": [[x, y], ...], "bbox": [...]}]}}
+    where every vertex was a list of two python floats.
+
+    Every part also has a min_scale (see part_min_scale), iter_parts / iter_points with a scale
+    go through the parts sorted by it and stop at the first one that is too small to draw.
+    zoom_culling=False keeps every part at min_scale 0 (shared borders get theirs from attach_arcs).
+    """
+
+    def __init__(self, kind, zoom_culling=True):
+        self.kind = kind
+        self.zoom_culling = zoom_culling
+        self.features = []
+        self.index = {}  # name -> feature id
+        self.coords = array("d")  # x, y pairs of all parts
+        self.offsets = array("l", [0])  # vertex offset of every part, part i is offsets[i]:offsets[i + 1]
+        self.bboxes = array("d")  # 4 values per part, not stored for points
+        self.part_feature = array("l")  # feature id of every part
+        self.min_scales = array("d")  # smallest scale every part is drawn at
+        self.order = None  # part ids sorted by min_scale, built on first culled iteration
+        self.order_scales = None  # min_scales in that order, for bisect
+        self.arcs = None  # shared borders (lines MapLayer, one feature per arc) if loaded from a topology
+
+    @classmethod
+    def from_dict(cls, key, data):
+        """Build a layer from the JSON structure of maps/<quality>/<file>.json."""
+        layer = cls(layer_kind(key))
+        for name, value in data.items():
+            if layer.kind == "points":
+                layer.add_feature(name, [[value["geometry"]]], value.get("rank"), value.get("capital", False))
+            else:
+                layer.add_feature(name, [part["points"] for part in value["geometry"]], scalerank=value.get("scalerank"))
+        return layer
+
+    @classmethod
+    def from_topology(cls, key, topology):
+        """Build a layer from maps/<quality>/polygons_topo.json (see topology.py), keeps the arcs for drawing borders."""
+        layer = cls(layer_kind(key))
+        arcs = topology["arcs"]
+        part_refs = []
+        for name, rings in topology["objects"].items():
+            parts = [ring_from_arcs(arcs, refs) for refs in rings]
+            layer.add_feature(name, parts)
+            part_refs.extend(refs for refs, points in zip(rings, parts) if points)
+        borders = cls("lines", zoom_culling=False)
+        for arc_id, arc in enumerate(arcs):
+            borders.add_feature(arc_id, [arc])
+        layer.attach_arcs(borders, part_refs)
+        return layer
+
+    @classmethod
+    def from_buffers(cls, kind, features, coords, zoom_culling=True, min_scales=None):
+        """
+        Build a layer around an already flat coordinate buffer (array("d"), see geometry_codec.py).
+        features - list of (name, vertex counts of its parts, rank, capital, scalerank) in buffer order.
+        min_scales - array("d") of every part computed when the data was built (.geo file), else computed here.
+        """
+        layer = cls(kind, zoom_culling and min_scales is None)
+        layer.coords = coords
+        vertex = 0
+        for name, part_sizes, rank, capital, scalerank in features:
+            feature_id = len(layer.features)
+            first_part = len(layer.offsets) - 1
+            for size in part_sizes:
+                bbox = None
+                if kind != "points":
+                    xs = coords[vertex * 2:(vertex + size) * 2:2]
+                    ys = coords[vertex * 2 + 1:(vertex + size) * 2:2]
+                    bbox = (min(xs), min(ys), max(xs), max(ys))
+                vertex += size
+                layer.add_part(feature_id, vertex, bbox, rank, capital, scalerank)
+            layer.features.append(Feature(feature_id, name, first_part, len(part_sizes), rank, capital))
+            layer.index[name] = feature_id
+        if min_scales is not None:
+            layer.min_scales = min_scales
+            layer.zoom_culling = zoom_culling
+        return layer
+
+    def add_feature(self, name, parts, rank=None, capital=False, scalerank=None):
+        """Append a feature made of parts (lists of [x, y]), replaces nothing - names are expected to be unique."""
+        feature_id = len(self.features)
+        first_part = len(self.offsets) - 1
+        part_count = 0
+        for points in parts:
+            if not points:
+                continue
+            self.coords.extend(chain.from_iterable(points))
+            bbox = None
+            if self.kind != "points":
+                xs = [p[0] for p in points]
+                ys = [p[1] for p in points]
+                bbox = (min(xs), min(ys), max(xs), max(ys))
+            self.add_part(feature_id, len(self.coords) // 2, bbox, rank, capital, scalerank)
+            part_count += 1
+
+        self.features.append(Feature(feature_id, name, first_part, part_count, rank, capital))
+        self.index[name] = feature_id
+        return feature_id
+
+    def add_part(self, feature_id, end, bbox, rank=None, capital=False, scalerank=None):
+        """Register a part whose vertices are already in coords and end at vertex end."""
+        start = self.offsets[-1]
+        self.offsets.append(end)
+        if bbox is not None:
+            self.bboxes.extend(bbox)
+        self.part_feature.append(feature_id)
+        if self.zoom_culling:
+            points = memoryview(self.coords)[start * 2:end * 2]
+            self.min_scales.append(part_min_scale(self.kind, points, bbox, rank, capital, scalerank))
+        else:
+            self.min_scales.append(0)
+        self.order = None
+
+    def attach_arcs(self, arcs, part_refs):
+        """
+        Keep the shared borders of a topology: arcs - lines MapLayer with one part per arc,
+        part_refs - arc refs of every part of this layer in part order.
+        An arc gets the smallest min_scale of the parts it bounds, so it is drawn exactly
+        when one of its countries is, borders of culled islands are culled with them.
+        """
+        min_scales = array("d", [math.inf]) * arcs.part_count()
+        for part, refs in enumerate(part_refs):
+            for ref in refs:
+                arc = ref if ref >= 0 else ~ref
+                min_scales[arc] = min(min_scales[arc], self.min_scales[part])
+        arcs.min_scales = min_scales
+        arcs.order = None
+        self.arcs = arcs
+
+    # query API ---------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.features)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def feature(self, name):
+        """Return Feature of the name or None."""
+        feature_id = self.index.get(name)
+        if feature_id is None:
+            return None
+        return self.features[feature_id]
+
+    def part_count(self):
+        return len(self.offsets) - 1
+
+    def term_parts(self, name):
+        """Range of part ids of a feature, empty if the name is not in the layer."""
+        feature = self.feature(name)
+        if feature is None:
+            return range(0)
+        return range(feature.first_part, feature.first_part + feature.part_count)
+
+    def part_coords(self, part):
+        """Flat x, y sequence of one part (a view into the buffer, no copy)."""
+        return memoryview(self.coords)[self.offsets[part] * 2:self.offsets[part + 1] * 2]
+
+    def part_points(self, part):
+        """List of (x, y) tuples of one part."""
+        coords = self.part_coords(part)
+        return list(zip(coords[0::2], coords[1::2]))
+
+    def part_bbox(self, part):
+        if self.kind == "points":
+            x, y = self.coords[self.offsets[part] * 2], self.coords[self.offsets[part] * 2 + 1]
+            return x, y, x, y
+        return tuple(self.bboxes[part * 4:part * 4 + 4])
+
+    def feature_bbox(self, name):
+        """(min_x, min_y, max_x, max_y) of all parts of a feature, None if missing or empty."""
+        boxes = [self.part_bbox(part) for part in self.term_parts(name)]
+        if not boxes:
+            return None
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def part_name(self, part):
+        return self.features[self.part_feature[part]].name
+
+    def extent(self):
+        """(min_x, min_y, max_x, max_y) of the whole layer, None if it is empty."""
+        if len(self.offsets) < 2:
+            return None
+        if self.kind == "points":
+            xs, ys = self.coords[0::2], self.coords[1::2]
+            return min(xs), min(ys), max(xs), max(ys)
+        bboxes = self.bboxes
+        return min(bboxes[0::4]), min(bboxes[1::4]), max(bboxes[2::4]), max(bboxes[3::4])
+
+    def parts_from(self, scale=None):
+        """Part ids drawn at scale (all if None), smallest min_scale first."""
+        if scale is None:
+            return range(len(self.offsets) - 1)
+        if self.order is None:
+            order = sorted(range(len(self.min_scales)), key=self.min_scales.__getitem__)
+            self.order_scales = array("d", [self.min_scales[part] for part in order])
+            self.order = array("l", order)
+        return self.order[:bisect_right(self.order_scales, scale)]
+
+    def iter_parts(self, scale=None):
+        """Yield (part id, feature name, bbox) of every part, with scale only of parts drawn at it."""
+        bboxes = self.bboxes
+        features = self.features
+        part_feature = self.part_feature
+        for part in self.parts_from(scale):
+            if self.kind == "points":
+                yield part, features[part_feature[part]].name, self.part_bbox(part)
+            else:
+                yield part, features[part_feature[part]].name, bboxes[part * 4:part * 4 + 4]
+
+    def point(self, name):
+        """(x, y) of a feature in a points layer, None if missing."""
+        feature = self.feature(name)
+        if feature is None:
+            return None
+        offset = self.offsets[feature.first_part] * 2
+        return self.coords[offset], self.coords[offset + 1]
+
+    def iter_points(self, scale=None):
+        """Yield (name, x, y, rank, capital) of every feature in a points layer, with scale only of those drawn at it."""
+        coords = self.coords
+        offsets = self.offsets
+        features = self.features
+        part_feature = self.part_feature
+        for part in self.parts_from(scale):
+            feature = features[part_feature[part]]
+            offset = offsets[part] * 2
+            yield feature.name, coords[offset], coords[offset + 1], feature.rank, feature.capital
+
+    def nbytes(self):
+        """Approximate resident size of the buffers (without feature records and names)."""
+        return sum(buffer.buffer_info()[1] * buffer.itemsize for buffer in (self.coords, self.offsets, self.bboxes, self.part_feature, self.min_scales))
+
+
+class ChunkedLayer:
+    """
+    Layer assembled from several MapLayer chunks (streamed bundles, spatial chunks).
+
+    Has the same query API as MapLayer, only the part ids are (chunk layer, part) pairs,
+    so code that treats part ids as opaque works with both.
+    Every feature lives in exactly one chunk.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.chunks = {}  # chunk id -> MapLayer
+        self.extents = {}  # chunk id -> extent of the chunk, None if empty
+        self.owner = {}  # feature name -> chunk id
+        self.arcs = None  # chunks are cut from polygons.json, borders are drawn per ring
+        self.version = 0  # bumped on every change, prepared frames of an older version are stale
+
+    def add_chunk(self, chunk_id, layer):
+        self.chunks[chunk_id] = layer
+        self.extents[chunk_id] = layer.extent()
+        self.version += 1
+        for name in layer:
+            self.owner[name] = chunk_id
+
+    def remove_chunk(self, chunk_id):
+        layer = self.chunks.pop(chunk_id, None)
+        self.extents.pop(chunk_id, None)
+        if layer is not None:
+            self.version += 1
+            for name in layer:
+                if self.owner.get(name) == chunk_id:
+                    del self.owner[name]
+
+    def __len__(self):
+        return len(self.owner)
+
+    def __contains__(self, name):
+        return name in self.owner
+
+    def __iter__(self):
+        return iter(list(self.owner))
+
+    def chunks_in(self, bbox):
+        """Sorted ids of the loaded chunks reaching into bbox (min_x, min_y, max_x, max_y)."""
+        min_x, min_y, max_x, max_y = bbox
+        return tuple(sorted(chunk_id for chunk_id, extent in self.extents.items()
+                            if extent is not None and extent[0] <= max_x and extent[2] >= min_x and extent[1] <= max_y and extent[3] >= min_y))
+
+    def chunk_of(self, name):
+        chunk_id = self.owner.get(name)
+        if chunk_id is None:
+            return None
+        return self.chunks.get(chunk_id)
+
+    def feature(self, name):
+        layer = self.chunk_of(name)
+        if layer is None:
+            return None
+        return layer.feature(name)
+
+    def part_count(self):
+        return sum(layer.part_count() for layer in list(self.chunks.values()))
+
+    def term_parts(self, name):
+        layer = self.chunk_of(name)
+        if layer is None:
+            return []
+        return [(layer, part) for part in layer.term_parts(name)]
+
+    def part_coords(self, part):
+        return part[0].part_coords(part[1])
+
+    def part_points(self, part):
+        return part[0].part_points(part[1])
+
+    def part_bbox(self, part):
+        return part[0].part_bbox(part[1])
+
+    def part_name(self, part):
+        return part[0].part_name(part[1])
+
+    def feature_bbox(self, name):
+        layer = self.chunk_of(name)
+        if layer is None:
+            return None
+        return layer.feature_bbox(name)
+
+    def iter_parts(self, scale=None):
+        for layer in list(self.chunks.values()):
+            for part, name, bbox in layer.iter_parts(scale):
+                yield (layer, part), name, bbox
+
+    def point(self, name):
+        layer = self.chunk_of(name)
+        if layer is None:
+            return None
+        return layer.point(name)
+
+    def iter_points(self, scale=None):
+        for layer in list(self.chunks.values()):
+            yield from layer.iter_points(scale)
+
+    def nbytes(self):
+        return sum(layer.nbytes() for layer in list(self.chunks.values()))
+
+
+# layers with identical file contents (custom terms are saved into every quality) are shared
+shared_layers = weakref.WeakValueDictionary()
+
+
+def current_topology(path, key):
+    """
+    Path of the topology file built from the JSON file at path (see topology.py), None if there is
+    none or it is older than the JSON (built before the JSON was edited, the JSON wins then).
+    """
+    topology_path = path[:-len(".json")] + "_topo.json"
+    if key != "polygons" or not os.path.exists(topology_path) or os.path.getmtime(topology_path) < os.path.getmtime(path):
+        return None
+    return topology_path
+
+
+def load_layer(path, key):
+    """
+    Load one JSON map file into a MapLayer, identical files share one layer object.
+    Uses the encoded .geo file (see geometry_codec.py) if it is not older than the JSON and of the current version,
+    countries are read from the topology file next to polygons.json if it was built.
+    """
+    import geometry_codec  # imports map_layer
+
+    sources = [path]
+    topology_path = current_topology(path, key)
+    topology = topology_path is not None
+    if topology:
+        sources.append(topology_path)
+    encoded_path = geometry_codec.encoded_path(path)
+    encoded = (os.path.exists(encoded_path) and all(os.path.getmtime(encoded_path) >= os.path.getmtime(source) for source in sources)
+               and geometry_codec.is_current(encoded_path))
+    if encoded:
+        path = encoded_path
+    elif topology:
+        path = topology_path
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = (key, hashlib.sha1(raw).hexdigest())
+    layer = shared_layers.get(digest)
+    if layer is None:
+        if encoded:
+            layer = geometry_codec.decode(raw)
+        elif topology:
+            layer = MapLayer.from_topology(key, json.loads(raw))
+        else:
+            layer = MapLayer.from_dict(key, json.loads(raw))
+        shared_layers[digest] = layer
+    return layer
+
+
+def load_data(directory, changes=None, out=None):
+    """
+    Load the layers of one quality directory ("High_quality", ...) into a dict of MapLayers.
+    changes - list of bools in LAYER_KEYS order, only those layers are (re)loaded into out.
+    """
+    if out is None:
+        out = {}
+    if changes is None:
+        changes = [True, True, True, True, True]
+    for key, change in zip(LAYER_KEYS, changes):
+        if change:
+            out[key] = load_layer(f"maps/{directory}/{LAYER_FILES[key]}.json", key)
+    return out
@@ -0,0 +1,35 @@
+import pygame
+
+MARKER_BATCH = 500  # markers per Surface.blits call (and per step of a time sliced render)
+MARKER_KEY = (255, 0, 255)  # transparent colour of the sprites, colour keyed blits are faster than per pixel alpha
+
+markers = {}  # (capital, map_index) -> (sprite, offset of its centre)
+
+
+def marker_style(capital, map_index):
+    """Colour and radius of a city marker, capitals are bigger and the markers grow with the quality."""
+    if capital:
+        return (209, 49, 245), 2 + map_index * 1.5
+    return (0, 0, 0), 1 + map_index / 2
+
+
+def get_marker(capital, map_index):
+    """Return the shared marker sprite of (capital, map_index), it is drawn only the first time."""
+    key = (capital, map_index)
+    marker = markers.get(key)
+    if marker is None:
+        color, radius = marker_style(capital, map_index)
+        offset = int(radius) + 1
+        sprite = pygame.Surface((offset * 2 + 1, offset * 2 + 1))
+        sprite.fill(MARKER_KEY)
+        sprite.set_colorkey(MARKER_KEY)
+        pygame.draw.circle(sprite, color, (offset, offset), radius)
+        marker = markers[key] = (sprite, offset)
+    return marker
+
+
+def marker_blits(points, map_index):
+    """(sprite, position) pairs of prepared points (scaled point, name, rank, capital) for Surface.blits."""
+    styles = (get_marker(False, map_index), get_marker(True, map_index))
+    return [(styles[capital][0], (int(x) - styles[capital][1], int(y) - styles[capital][1]))
+            for (x, y), name, rank, capital in points]
@@ -0,0 +1,102 @@
+import sys
+
+from map_layer import LAYER_KEYS, QUALITIES
+
+MB = 1024 * 1024
+# the browser tab and old classroom machines get less
+DEFAULT_BUDGET = 96 * MB if sys.platform == "emscripten" else 256 * MB
+FEATURE_BYTES = 250  # Feature record, name and index entry of one feature, not counted by nbytes()
+
+
+def layer_size(layer):
+    """Approximate memory of a loaded MapLayer / ChunkedLayer in bytes."""
+    return layer.nbytes() + FEATURE_BYTES * len(layer)
+
+
+class MemoryManager:
+    """
+    Keeps the loaded map data and the geometry caches under a memory budget.
+
+    Units are (quality index, layer key) of the loader and caches ("cache", name).
+    Every unit remembers the frame it was last used in, collect() (once per frame) evicts the
+    least recently used ones until the total fits the budget. Evicted layers are released
+    through the loader and requested again when the quiz needs them, evicted caches are cleared
+    and rebuild themselves. Low quality layers are never evicted, everything falls back to them.
+    """
+
+    def __init__(self, loader, budget=DEFAULT_BUDGET):
+        self.loader = loader
+        self.budget = budget
+        self.frame = 0
+        self.units = {}  # name -> [size, last used frame, release function]
+        self.layers = {}  # (quality index, key) -> layer object the size was measured for
+        self.evicted = set()  # (quality index, key) released over the budget, requested again when used
+
+    def use(self, name, size, release):
+        """Mark a cache (or any other unit) as used this frame, release() frees it."""
+        unit = self.units.get(name)
+        if unit is None:
+            self.units[name] = [size, self.frame, release]
+        else:
+            unit[0] = size
+            unit[1] = self.frame
+
+    def use_layer(self, index, key):
+        """Mark a layer as used this frame, request it from the loader if it was evicted."""
+        name = (index, key)
+        if name in self.evicted:  # the loader may keep an empty placeholder (BundleStreamer), so it is tracked here
+            self.evicted.discard(name)
+            self.loader.request(index, key)
+        unit = self.units.get(name)
+        if unit is not None:
+            unit[1] = self.frame
+
+    def total(self):
+        return sum(unit[0] for unit in self.units.values())
+
+    def sync_layers(self):
+        """Register layers the loader added (or replaced) since the last frame."""
+        for index, layers in enumerate(self.loader.qualities):
+            for key in LAYER_KEYS:
+                layer = layers.get(key)
+                name = (index, key)
+                if layer is None:
+                    self.units.pop(name, None)
+                    self.layers.pop(name, None)
+                elif self.layers.get(name) is not layer or name not in self.units:
+                    self.layers[name] = layer
+                    self.use(name, layer_size(layer), lambda name=name: self.release_layer(name))
+                elif getattr(layer, "version", 0):  # chunked layers grow while streaming
+                    self.units[name][0] = layer_size(layer)
+
+    def release_layer(self, name):
+        index, key = name
+        self.loader.release(index, key)
+        self.layers.pop(name, None)
+        self.evicted.add(name)
+
+    def collect(self):
+        """Evict least recently used units over the budget, call once per frame."""
+        self.sync_layers()
+        total = self.total()
+        if total > self.budget:
+            candidates = sorted(((unit[1], name) for name, unit in self.units.items()
+                                 if unit[1] < self.frame and name[0] != 0), key=lambda candidate: candidate[0])
+            for last_used, name in candidates:
+                if total <= self.budget:
+                    break
+                size, _, release = self.units.pop(name)
+                release()
+                total -= size
+        self.frame += 1
+
+    def report(self):
+        """Sizes of the units in MB, biggest first (for debugging the budget)."""
+        named = []
+        for name, unit in self.units.items():
+            if name[0] == "cache":
+                name = name[1]
+            else:
+                name = QUALITIES[name[0]] + "/" + name[1]
+            named.append((round(unit[0] / MB, 2), name))
+        return sorted(named, reverse=True)
@@ -0,0 +1,82 @@
+import pygame
+
+PICK_RADIUS = 10  # same hit radius as the circle_*_collision checks
+
+
+def encode_color(index):
+    """Colour of the feature with index (1 based, 0 is the background) in the picking surface."""
+    return (index >> 16) & 255, (index >> 8) & 255, index & 255
+
+
+def decode_color(color):
+    return (color[0] << 16) | (color[1] << 8) | color[2]
+
+
+class PickBuffer:
+    """
+    Offscreen surface where every visible feature is drawn in its own colour.
+
+    Looking up what is under the mouse is then one pixel read instead of testing the
+    geometry of every feature. The surface is only redrawn when the prepared frame changes.
+    Points and lines are widened to PICK_RADIUS, polygons get a PICK_RADIUS wide border
+    under their fill, so hits match the collision checks used before.
+    Later layers are drawn on top and win: polygons < new_polygons < blue_polygons < lines < points.
+    """
+
+    def __init__(self):
+        self.surface = None
+        self.key = None
+        self.terms = [None]  # colour index -> [layer key, name]
+
+    def update(self, key, frame, size):
+        """Redraw the buffer if the frame (identified by key, see FramePreparer) or the size changed."""
+        if key == self.key and self.surface is not None and self.surface.get_size() == size:
+            return
+        self.key = key
+        if self.surface is None or self.surface.get_size() != size:
+            self.surface = pygame.Surface(size, 0, 32)
+        self.surface.fill((0, 0, 0))
+        self.terms = [None]
+        index = {}
+
+        def color_of(layer, name):
+            term = (layer, name)
+            if term not in index:
+                index[term] = len(self.terms)
+                self.terms.append([layer, name])
+            return encode_color(index[term])
+
+        # parts of one feature can be spread over the layer, outlines go under all fills
+        for layer in ("polygons", "new_polygons", "blue_polygons"):
+            for polygon, name in frame.get(layer, ()):
+                pygame.draw.lines(self.surface, color_of(layer, name), True, polygon, PICK_RADIUS * 2)
+            for polygon, name in frame.get(layer, ()):
+                pygame.draw.polygon(self.surface, color_of(layer, name), polygon)
+
+        for line, name in frame.get("lines", ()):
+            pygame.draw.lines(self.surface, color_of("lines", name), False, line, PICK_RADIUS * 2)
+
+        for point, name, _, _ in frame.get("points", ()):
+            pygame.draw.circle(self.surface, color_of("points", name), point, PICK_RADIUS)
+
+    def nbytes(self):
+        if self.surface is None:
+            return 0
+        return self.surface.get_width() * self.surface.get_height() * 4
+
+    def clear(self):
+        self.surface = None
+        self.key = None
+        self.terms = [None]
+
+    def pick(self, pos):
+        """Return [layer key, name] of the feature at pos (surface coordinates), None if there is none."""
+        if self.surface is None:
+            return None
+        x, y = int(pos[0]), int(pos[1])
+        if not (0 <= x < self.surface.get_width() and 0 <= y < self.surface.get_height()):
+            return None
+        index = decode_color(self.surface.get_at((x, y)))
+        if index >= len(self.terms):
+            return None
+        return self.terms[index]
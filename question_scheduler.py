@@ -0,0 +1,114 @@
+import heapq
+import random
+
+
+class QuestionScheduler:
+    """
+    Picks the places a quiz asks about.
+
+    The learning set is flattened once into a pool of [layer, name] items, so every
+    draw is O(1) (O(log n) with spaced repetition) no matter how the set is shaped.
+
+    Without spaced repetition the pool is shuffled and drawn without replacement,
+    every item is asked once before anything repeats.
+    With spaced repetition every item has a due step in a heap, correct answers push
+    the item further away (interval doubles), wrong answers bring it back soon.
+    """
+
+    def __init__(self, items, spaced=False, rng=None):
+        self.rng = rng if rng is not None else random.Random()
+        self.spaced = spaced
+
+        # flat pool of unique items, order of the learning set is kept
+        self.pool = []
+        seen = set()
+        for key, names in items.items():
+            for name in names:
+                if (key, name) not in seen:
+                    seen.add((key, name))
+                    self.pool.append([key, name])
+
+        # plain mode
+        self.order = []
+        self.next_index = 0
+        self.last = None
+
+        # spaced repetition mode
+        self.step = 0
+        self.history = {}  # (key, name) -> [interval, correct, wrong, version]
+        self.heap = []
+        self.counter = 0
+        for item in self.pool:
+            self.history[tuple(item)] = [1, 0, 0, 0]
+            self.push(item, 0)
+
+    def __len__(self):
+        return len(self.pool)
+
+    def push(self, item, due):
+        entry = self.history[tuple(item)]
+        self.counter += 1
+        heapq.heappush(self.heap, (due, self.counter, entry[3], item))
+
+    def reshuffle(self):
+        self.order = self.pool[:]
+        self.rng.shuffle(self.order)
+        # dont ask the same place twice in a row across the reshuffle
+        if len(self.order) > 1 and self.order[0] == self.last:
+            self.order[0], self.order[-1] = self.order[-1], self.order[0]
+        self.next_index = 0
+
+    def draw(self):
+        """Return the next [layer, name] to ask about, None if the pool is empty."""
+        if not self.pool:
+            return None
+
+        if self.spaced:
+            self.step += 1
+            while True:
+                due, _, version, item = heapq.heappop(self.heap)
+                if version == self.history[tuple(item)][3]:  # skip outdated entries
+                    break
+            # until it is answered the item comes back after its current interval
+            self.push(item, self.step + self.history[tuple(item)][0])
+            self.last = item
+            return list(item)
+
+        if self.next_index >= len(self.order):
+            self.reshuffle()
+        item = self.order[self.next_index]
+        self.next_index += 1
+        self.last = item
+        return list(item)
+
+    def sample(self, count):
+        """Return up to count distinct items (used to fill the quiz in mode 3)."""
+        if self.spaced:
+            # the most due items, every item has one current heap entry so they are distinct
+            self.step += 1
+            out = []
+            while self.heap and len(out) < count:
+                due, _, version, item = heapq.heappop(self.heap)
+                if version == self.history[tuple(item)][3]:  # skip outdated entries
+                    out.append(item)
+            for item in out:
+                self.push(item, self.step + self.history[tuple(item)][0])
+            if out:
+                self.last = out[-1]
+            return [list(item) for item in out]
+        return [list(item) for item in self.rng.sample(self.pool, min(count, len(self.pool)))]
+
+    def record(self, item, correct):
+        """Store the result of a question, reschedules the item in spaced repetition mode."""
+        if item is None or tuple(item) not in self.history:
+            return
+        entry = self.history[tuple(item)]
+        if correct:
+            entry[0] *= 2
+            entry[1] += 1
+        else:
+            entry[0] = 1
+            entry[2] += 1
+        if self.spaced:
+            entry[3] += 1  # invalidates the entry pushed by draw()
+            self.push(item, self.step + entry[0])
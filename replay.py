@@ -0,0 +1,49 @@
+"""
+Headless replay of a session recorded with `python main.py --record session.json` (see input_recording.py).
+
+    python replay.py session.json [timings.json]
+
+Runs main() without a window on the recorded input and prints how long the frames took,
+with a second argument all frame times (ms) are written there as JSON.
+"""
+import asyncio
+import json
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame  # noqa: E402
+
+import main  # noqa: E402 - creates the (hidden) window
+from input_recording import InputReplayer  # noqa: E402
+
+
+def replay(path):
+    """Play the session at path through main(), returns the InputReplayer with the frame times."""
+    replayer = InputReplayer(path)
+    main.screen = pygame.display.set_mode(replayer.size)
+    replayer.install()
+    try:
+        asyncio.run(main.main(replayer))
+    finally:
+        replayer.restore()
+    return replayer
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    replayer = replay(sys.argv[1])
+    report = replayer.report()
+    print(f"{report['frames']} frames of {len(replayer.frames)} replayed")
+    if report["frames"]:
+        print("  ".join(f"{name} {report[name]:.1f} ms" for name in ("total", "mean", "median", "p95", "p99", "max")))
+        slowest = sorted(range(len(replayer.frame_times)), key=lambda i: replayer.frame_times[i], reverse=True)[:5]
+        print("slowest frames:", ", ".join(f"#{i} {replayer.frame_times[i] * 1000:.1f} ms" for i in slowest))
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as f:
+            json.dump({"session": sys.argv[1], "report": report, "frame_times": [seconds * 1000 for seconds in replayer.frame_times]}, f)
+    pygame.quit()
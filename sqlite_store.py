@@ -0,0 +1,189 @@
+"""
+Optional on-disk map store in SQLite, built from the JSON map files with `python sqlite_store.py`.
+
+Every layer key has a table of features (one row per feature and quality, the geometry packed
+into blobs) and an R*Tree over their bboxes with the quality as a third dimension, so
+"features of a layer intersecting a bbox at a quality" is answered from disk without loading
+the layer. Terms (maps/terms.json) and learning sets (maps/learning_sets) have their own tables.
+DataLoader reads from the store instead of the JSON files when it is not older than them.
+"""
+import json
+import os
+import sqlite3
+import time
+from array import array
+
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, MapLayer, current_topology, layer_kind
+from topology import ring_from_arcs
+
+STORE_PATH = "maps/maps.sqlite"
+
+
+def source_paths():
+    """JSON files the store is built from."""
+    paths = ["maps/terms.json"]
+    for quality in QUALITIES:
+        for key in LAYER_KEYS:
+            path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+            if os.path.exists(path):
+                paths.append(path)
+            if key == "polygons" and os.path.exists(path[:-len(".json")] + "_topo.json"):
+                paths.append(path[:-len(".json")] + "_topo.json")
+    return paths
+
+
+def store_is_current(path=STORE_PATH):
+    """True if the store exists and is not older than any map file it was built from."""
+    if not os.path.exists(path):
+        return False
+    built = os.path.getmtime(path)
+    return all(os.path.getmtime(source) <= built for source in source_paths())
+
+
+def json_features(key, path):
+    """Yield (name, parts, rank, capital, scalerank) of a map file, countries from the topology if built."""
+    topology_path = current_topology(path, key)
+    if topology_path is not None:
+        with open(topology_path, "r") as f:
+            topology = json.load(f)
+        for name, rings in topology["objects"].items():
+            yield name, [ring_from_arcs(topology["arcs"], refs) for refs in rings], None, False, None
+        return
+    with open(path, "r") as f:
+        data = json.load(f)
+    for name, value in data.items():
+        if key == "points":
+            yield name, [[value["geometry"]]], value.get("rank"), value.get("capital", False), None
+        else:
+            yield name, [part["points"] for part in value["geometry"]], None, False, value.get("scalerank")
+
+
+class GeometryStore:
+    """Connection to the store, usable as a context manager (closes the connection)."""
+
+    def __init__(self, path=STORE_PATH):
+        self.db = sqlite3.connect(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def create_tables(self):
+        for key in LAYER_KEYS:
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS {key} (id INTEGER PRIMARY KEY, quality INTEGER, name TEXT, "
+                            f"rank INTEGER, capital INTEGER, scalerank INTEGER, parts BLOB, coords BLOB, UNIQUE (quality, name))")
+            self.db.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {key}_index USING rtree(id, min_x, max_x, min_y, max_y, min_quality, max_quality)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS terms (layer TEXT, name TEXT, PRIMARY KEY (layer, name))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS learning_sets (name TEXT PRIMARY KEY, continent TEXT, items TEXT)")
+
+    def insert_feature(self, key, quality, name, parts, rank=None, capital=False, scalerank=None):
+        """Insert (or replace) a feature made of parts (lists of [x, y]) in one quality, no commit."""
+        parts = [points for points in parts if points]
+        if not parts:
+            return
+        sizes = array("i", [len(points) for points in parts])
+        coords = array("d", [value for points in parts for point in points for value in point])
+        xs, ys = coords[0::2], coords[1::2]
+        old = self.db.execute(f"SELECT id FROM {key} WHERE quality = ? AND name = ?", (quality, name)).fetchone()
+        if old is not None:
+            self.db.execute(f"DELETE FROM {key} WHERE id = ?", old)
+            self.db.execute(f"DELETE FROM {key}_index WHERE id = ?", old)
+        cursor = self.db.execute(f"INSERT INTO {key} (quality, name, rank, capital, scalerank, parts, coords) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 (quality, name, rank, int(bool(capital)), scalerank, sizes.tobytes(), coords.tobytes()))
+        self.db.execute(f"INSERT INTO {key}_index VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, min(xs), max(xs), min(ys), max(ys), quality, quality))
+
+    def features(self, key, quality, bbox=None):
+        """
+        Return [(name, vertex counts of its parts, rank, capital, scalerank, coords)] of a layer in a quality
+        (index into QUALITIES), with bbox (min_x, min_y, max_x, max_y) only the features intersecting it.
+        coords is an array("d") of x, y pairs of all parts.
+        """
+        if key not in LAYER_KEYS:
+            raise ValueError(f"unknown layer {key}")
+        columns = "f.name, f.rank, f.capital, f.scalerank, f.parts, f.coords"
+        if bbox is None:
+            rows = self.db.execute(f"SELECT {columns} FROM {key} AS f WHERE f.quality = ? ORDER BY f.id", (quality,))
+        else:
+            rows = self.db.execute(f"SELECT {columns} FROM {key}_index AS i JOIN {key} AS f ON f.id = i.id "
+                                   "WHERE i.min_quality <= ? AND i.max_quality >= ? AND i.max_x >= ? AND i.min_x <= ? "
+                                   "AND i.max_y >= ? AND i.min_y <= ? ORDER BY f.id",
+                                   (quality, quality, bbox[0], bbox[2], bbox[1], bbox[3]))
+        out = []
+        for name, rank, capital, scalerank, parts, coords in rows:
+            sizes = array("i")
+            sizes.frombytes(parts)
+            points = array("d")
+            points.frombytes(coords)
+            out.append((name, sizes, rank, bool(capital), scalerank, points))
+        return out
+
+    def load_layer(self, key, quality, bbox=None):
+        """MapLayer of a layer in a quality, with bbox only of the features intersecting it."""
+        features = self.features(key, quality, bbox)
+        coords = array("d")
+        for feature in features:
+            coords.extend(feature[5])
+        return MapLayer.from_buffers(layer_kind(key), [feature[:5] for feature in features], coords)
+
+    def terms(self):
+        """{layer key: [names]} like maps/terms.json."""
+        out = {key: [] for key in LAYER_KEYS}
+        for layer, name in self.db.execute("SELECT layer, name FROM terms ORDER BY rowid"):
+            out.setdefault(layer, []).append(name)
+        return out
+
+    def learning_sets(self):
+        """{name: {"Continent": ..., "items": {key: [names]}}} like the files in maps/learning_sets."""
+        return {name: {"Continent": continent, "items": json.loads(items)}
+                for name, continent, items in self.db.execute("SELECT name, continent, items FROM learning_sets")}
+
+    def save_term(self, key, name, parts, rank=None, capital=False):
+        """Add a custom term to every quality and the term list in one transaction."""
+        with self.db:
+            for quality in range(len(QUALITIES)):
+                self.insert_feature(key, quality, name, parts, rank, capital)
+            self.db.execute("INSERT OR IGNORE INTO terms VALUES (?, ?)", (key, name))
+
+    def save_learning_set(self, name, continent, items):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO learning_sets VALUES (?, ?, ?)", (name, continent, json.dumps(items)))
+
+
+def build_store(path=STORE_PATH):
+    """(Re)build the store from the JSON map files, terms and learning sets."""
+    if os.path.exists(path):
+        os.remove(path)
+    with GeometryStore(path) as store:
+        with store.db:
+            store.create_tables()
+            for quality_index, quality in enumerate(QUALITIES):
+                for key in LAYER_KEYS:
+                    json_path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+                    if not os.path.exists(json_path):
+                        continue
+                    for name, parts, rank, capital, scalerank in json_features(key, json_path):
+                        store.insert_feature(key, quality_index, name, parts, rank, capital, scalerank)
+            with open("maps/terms.json", "r") as f:
+                for key, names in json.load(f).items():
+                    store.db.executemany("INSERT OR IGNORE INTO terms VALUES (?, ?)", [(key, name) for name in names])
+            for file_name in os.listdir("maps/learning_sets"):
+                with open(f"maps/learning_sets/{file_name}", "r") as f:
+                    learning_set = json.load(f)
+                store.db.execute("INSERT OR REPLACE INTO learning_sets VALUES (?, ?, ?)",
+                                 (file_name.replace(".json", ""), learning_set["Continent"], json.dumps(learning_set["items"])))
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    build_store()
+    print(f"{STORE_PATH}: {os.path.getsize(STORE_PATH)} bytes in {time.perf_counter() - start:.1f} s")
+    with GeometryStore() as store:
+        start = time.perf_counter()
+        layer = store.load_layer("polygons", 0, (-25, 35, 45, 110))  # Europe
+        print(f"Low quality countries in Europe: {len(layer)} features in {(time.perf_counter() - start) * 1000:.1f} ms")
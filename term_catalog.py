@@ -0,0 +1,181 @@
+"""
+Catalog of the terms: where every term is and how big it is, without loading its geometry.
+
+maps/term_catalog.json holds
+    {"version": VERSION, "sources": {layer key: {"<quality>/<file>": sha1 of the map file}},
+     "terms": {layer key: {name: {"bbox": [min_x, min_y, max_x, max_y], "main_bbox": [...],
+                                  "vertices": [Low, Medium, High vertex count or None]}}}}
+bbox covers all parts of the term, main_bbox only parts of at least MAIN_PART_AREA of the biggest one
+(France without French Guiana, used to frame a term), both from the finest quality the term exists in.
+Cities have a "point" [x, y] instead. vertices tell which qualities hold the term (see term_qualities).
+Built from the layer files with `python term_catalog.py` (a build output, not in git), only layers
+whose files changed since the last build are read again. Terms saved in the term creator are appended
+to ADDED_PATH by add_term, one line each, and folded in by the next build.
+"""
+import hashlib
+import json
+import math
+import os
+
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, MapLayer, layer_kind, load_layer
+
+CATALOG_PATH = "maps/term_catalog.json"
+ADDED_PATH = "maps/term_catalog_added.jsonl"  # [key, name, entry] per line, terms added since the last build
+MAIN_PART_AREA = 0.1
+VERSION = 2  # bump when the entries change, older catalogs are rebuilt as a whole
+
+catalog = None
+
+
+def round_bbox(bbox):
+    """Round outwards to 0.01 map units, the catalog stays small and still covers the term."""
+    return [math.floor(bbox[0] * 100) / 100, math.floor(bbox[1] * 100) / 100,
+            math.ceil(bbox[2] * 100) / 100, math.ceil(bbox[3] * 100) / 100]
+
+
+def union_bbox(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def main_bbox(boxes):
+    """Union of the part bboxes of at least MAIN_PART_AREA of the biggest one (France without French Guiana), None without parts."""
+    if not boxes:
+        return None
+    areas = [(b[2] - b[0]) * (b[3] - b[1]) for b in boxes]
+    biggest = max(areas)
+    return union_bbox([b for b, area in zip(boxes, areas) if area >= biggest * MAIN_PART_AREA])
+
+
+def term_entry(layers, name):
+    """Catalog entry of a term from [(quality index, layer)], None if no layer has it."""
+    vertices = [None] * len(QUALITIES)
+    finest = None
+    for index, layer in layers:
+        parts = layer.term_parts(name)
+        if len(parts):
+            vertices[index] = sum(len(layer.part_coords(part)) // 2 for part in parts)
+            if finest is None or index > finest[0]:
+                finest = index, layer
+    if finest is None:
+        return None
+    layer = finest[1]
+    entry = {"vertices": vertices}
+    if layer.kind == "points":
+        entry["point"] = [round(value, 3) for value in layer.point(name)]
+        return entry
+
+    boxes = [layer.part_bbox(part) for part in layer.term_parts(name)]
+    entry["bbox"] = round_bbox(union_bbox(boxes))
+    entry["main_bbox"] = round_bbox(main_bbox(boxes))
+    return entry
+
+
+def layer_sources(key):
+    """{"<quality>/<file>": path} of the files a layer is loaded from."""
+    sources = {}
+    for quality in QUALITIES:
+        path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+        if os.path.exists(path):
+            sources[f"{quality}/{LAYER_FILES[key]}"] = path
+            topology_path = path[:-len(".json")] + "_topo.json"
+            if key == "polygons" and os.path.exists(topology_path):
+                sources[f"{quality}/{LAYER_FILES[key]}_topo"] = topology_path
+    return sources
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def build_catalog(path=CATALOG_PATH):
+    """Update the catalog file, returns the layer keys that were rebuilt."""
+    global catalog
+    old = {"sources": {}, "terms": {}}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            old = json.load(f)
+        if old.get("version") != VERSION:
+            old = {"sources": {}, "terms": {}}
+    new = {"version": VERSION, "sources": {}, "terms": {}}
+    rebuilt = []
+    for key in LAYER_KEYS:
+        sources = new["sources"][key] = {name: file_digest(source) for name, source in layer_sources(key).items()}
+        if key in old["terms"] and old["sources"].get(key) == sources:
+            new["terms"][key] = old["terms"][key]  # files unchanged
+            continue
+        layers = []
+        for index, quality in enumerate(QUALITIES):
+            layer_path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+            if os.path.exists(layer_path):
+                layers.append((index, load_layer(layer_path, key)))
+        names = {}
+        for index, layer in reversed(layers):  # finest first, dicts keep the order
+            names.update(dict.fromkeys(layer))
+        terms = new["terms"][key] = {}
+        for name in names:
+            entry = term_entry(layers, name)
+            if entry is not None:
+                terms[name] = entry
+        rebuilt.append(key)
+    with open(path, "w") as f:
+        json.dump(new, f, separators=(",", ":"), ensure_ascii=False)
+    if os.path.exists(ADDED_PATH):  # added terms are saved in the layer files, so they were read again
+        os.remove(ADDED_PATH)
+    catalog = new
+    return rebuilt
+
+
+def get_catalog():
+    """The shared catalog with the terms added since it was built, loaded on first use (empty if it was not built)."""
+    global catalog
+    if catalog is None:
+        catalog = {"sources": {}, "terms": {}}
+        if os.path.exists(CATALOG_PATH):
+            with open(CATALOG_PATH, "r") as f:
+                catalog = json.load(f)
+        if os.path.exists(ADDED_PATH):
+            with open(ADDED_PATH, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        key, name, entry = json.loads(line)
+                        catalog["terms"].setdefault(key, {})[name] = entry
+    return catalog
+
+
+def term_info(key, name):
+    """Catalog entry of a term, None if it is not in the catalog."""
+    return get_catalog()["terms"].get(key, {}).get(name)
+
+
+def term_bbox(info, main=True):
+    """Bbox of a catalog entry (main_bbox unless main is False), cities give their point."""
+    if "bbox" not in info:
+        x, y = info["point"]
+        return x, y, x, y
+    return info["main_bbox"] if main else info["bbox"]
+
+
+def term_qualities(info):
+    """Quality indexes the term exists in (by the catalog, the layers may have changed since it was built)."""
+    return [index for index, count in enumerate(info["vertices"]) if count is not None]
+
+
+def add_term(key, name, parts):
+    """Add a term created in the term creator (parts - lists of [x, y], saved in every quality), appended to ADDED_PATH."""
+    layer = MapLayer(layer_kind(key))
+    layer.add_feature(name, parts)
+    entry = term_entry([(index, layer) for index in range(len(QUALITIES))], name)
+    if entry is None:
+        return
+    get_catalog()["terms"].setdefault(key, {})[name] = entry
+    with open(ADDED_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps([key, name, entry], ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    rebuilt = build_catalog()
+    terms = get_catalog()["terms"]
+    print("rebuilt:", ", ".join(rebuilt) or "nothing")
+    print(sum(len(names) for names in terms.values()), "terms,", os.path.getsize(CATALOG_PATH), "bytes")
@@ -1,8 +1,16 @@
 import json
 
-info = json.load(open("maps/World_h.json"))
+from term_catalog import build_catalog, get_catalog
 
-keys = [item for item in info.keys()]
-names = [{item: list(info[item].keys())} for item in [key for key in keys]]
-print(names)
+# adds the names of the term catalog (built from the layer files) missing in maps/terms.json,
+# terms already listed there are kept in their order, nothing is removed
+build_catalog()
+with open("maps/terms.json", "r") as f:
+    names = json.load(f)
+added = {}
+for key, terms in get_catalog()["terms"].items():
+    known = set(names.setdefault(key, []))
+    added[key] = [name for name in terms if name not in known]
+    names[key].extend(added[key])
+print({key: len(terms) for key, terms in added.items()})
 json.dump(names, open("maps/terms.json", "w"))
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_preparer import FramePreparer, View, frame_key  # noqa: E402
+from map_layer import ChunkedLayer, MapLayer  # noqa: E402
+
+
+def river_chunk(name, x):
+    layer = MapLayer("lines")
+    layer.add_feature(name, [[[x, 0.0], [x + 1.0, 1.0]]])
+    return layer
+
+
+def test_chunks_streamed_in_off_screen_keep_the_frame_key():
+    layer = ChunkedLayer("lines")
+    layer.add_chunk("near", river_chunk("Near river", 0.0))
+    view = View(1, 100.0, 640.0, 360.0, 1280, 720)  # about -6.4..6.4 x -3.6..3.6
+    key = frame_key(view, {"lines": layer})
+
+    layer.add_chunk("far", river_chunk("Far river", 100.0))
+    assert frame_key(view, {"lines": layer}) == key
+    layer.remove_chunk("far")
+    assert frame_key(view, {"lines": layer}) == key
+
+    layer.add_chunk("close", river_chunk("Close river", 3.0))
+    assert frame_key(view, {"lines": layer}) != key
+
+
+def test_worker_frame_is_swapped_in_when_done():
+    layer = MapLayer("lines")
+    layer.add_feature("River", [[[0.0, 0.0], [1.0, 1.0]]])
+    view = View(1, 100.0, 640.0, 360.0, 1280, 720)
+    layers = {"lines": layer}
+    expected = FramePreparer(threaded=False).prepare(view, layers)
+
+    preparer = FramePreparer(threaded=True)
+    old_front = preparer.front
+    steps = preparer.prepare_steps(view, layers)
+    for waiting in steps:
+        assert waiting is True  # only waits for the worker, never prepares on this thread
+        assert preparer.front is old_front or preparer.front["key"] == frame_key(view, layers)
+        time.sleep(0.001)
+    assert preparer.front["key"] == frame_key(view, layers)
+    assert preparer.front["layers"] == expected
+    assert preparer.back is old_front
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame  # noqa: E402
+
+from frame_scheduler import FrameScheduler  # noqa: E402
+
+
+def test_idle_wait_keeps_the_events_in_order():
+    pygame.display.init()
+    pygame.display.set_mode((64, 64))
+    pygame.event.clear()
+    scheduler = FrameScheduler(pygame.time.Clock())
+    first = pygame.event.Event(pygame.USEREVENT, {"order": 1})
+    second = pygame.event.Event(pygame.USEREVENT, {"order": 2})
+    pygame.event.post(first)
+    pygame.event.post(second)
+
+    asyncio.run(scheduler.wait())  # returns at once, there are events
+
+    assert [event.order for event in pygame.event.get(pygame.USEREVENT)] == [1, 2]
+    pygame.display.quit()
+
+
+def test_wait_callbacks_run_once_when_the_loop_waits():
+    scheduler = FrameScheduler(pygame.time.Clock())
+    calls = []
+    scheduler.on_wait(lambda: calls.append(1))
+    scheduler.busy()
+
+    asyncio.run(scheduler.wait())
+    asyncio.run(scheduler.wait())
+
+    assert calls == [1]
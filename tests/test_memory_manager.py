@@ -0,0 +1,51 @@
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bundles import BundleStreamer  # noqa: E402
+from memory_manager import MemoryManager  # noqa: E402
+
+RIVER = {"geometry": [{"points": [[0.0, 0.0], [1.0, 1.0], [2.0, 0.5]]}]}
+
+
+def write_bundles(directory):
+    """A manifest with one rivers chunk in Low and one in Medium quality."""
+    layers = {}
+    for quality, name in (("Low_quality", "Low river"), ("Medium_quality", "Medium river")):
+        os.makedirs(os.path.join(directory, quality))
+        raw = gzip.compress(json.dumps({name: RIVER}).encode())
+        file = f"{quality}/rivers_4_4.json.gz"
+        with open(os.path.join(directory, file), "wb") as f:
+            f.write(raw)
+        layers[quality] = {"lines": [{"file": file, "cell": [4, 4], "bbox": [0.0, 0.0, 2.0, 1.0],
+                                      "names": [name], "bytes": len(raw), "raw_bytes": 0}]}
+    path = os.path.join(directory, "manifest.json")
+    with open(path, "w") as f:
+        json.dump({"version": 1, "grid": 8, "extent": [-200, -200, 200, 200], "layers": layers}, f)
+    return path
+
+
+def test_evicted_bundle_layer_is_streamed_again(tmp_path):
+    streamer = BundleStreamer(write_bundles(str(tmp_path)))
+    while streamer.step():
+        pass
+    assert len(streamer.qualities[1]["lines"]) == 1
+
+    memory = MemoryManager(streamer, budget=0)
+    memory.collect()
+    memory.collect()  # nothing was used in the last frame, Medium quality goes over the budget
+    assert len(streamer.qualities[1]["lines"]) == 0
+    assert len(streamer.qualities[0]["lines"]) == 1  # Low quality is never evicted
+
+    memory.budget = 10 ** 9
+    memory.use_layer(1, "lines")
+    assert not streamer.done()
+    while streamer.step():
+        pass
+    assert "Medium river" in streamer.qualities[1]["lines"]
+    memory.collect()
+    memory.use_layer(1, "lines")  # loaded again, nothing more to request
+    assert streamer.done()
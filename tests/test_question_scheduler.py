@@ -0,0 +1,46 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_scheduler import QuestionScheduler  # noqa: E402
+
+ITEMS = {"polygons": [f"country {i}" for i in range(12)], "points": [f"city {i}" for i in range(8)]}
+
+
+def test_sample_is_distinct_in_spaced_mode():
+    rng = random.Random(1)
+    scheduler = QuestionScheduler(ITEMS, spaced=True, rng=rng)
+    for _ in range(200):
+        sample = scheduler.sample(10)
+        assert len(sample) == 10
+        assert len(set(map(tuple, sample))) == 10
+        for item in sample:
+            scheduler.record(item, rng.random() < 0.7)
+        scheduler.record(scheduler.draw(), rng.random() < 0.5)
+
+
+def test_sample_of_small_pool_in_spaced_mode():
+    scheduler = QuestionScheduler({"points": ["a", "b", "c"]}, spaced=True)
+    for _ in range(20):
+        assert sorted(name for key, name in scheduler.sample(10)) == ["a", "b", "c"]
+
+
+def test_sample_is_distinct_in_plain_mode():
+    scheduler = QuestionScheduler(ITEMS, rng=random.Random(2))
+    for _ in range(50):
+        sample = scheduler.sample(10)
+        assert len(set(map(tuple, sample))) == 10
+
+
+def test_spaced_mode_asks_wrong_answers_sooner():
+    scheduler = QuestionScheduler(ITEMS, spaced=True, rng=random.Random(3))
+    wrong = scheduler.draw()
+    scheduler.record(wrong, False)
+    for _ in range(5):
+        item = scheduler.draw()
+        if item != wrong:
+            scheduler.record(item, True)
+    asked = [scheduler.draw() for _ in range(len(ITEMS["polygons"]) + len(ITEMS["points"]))]
+    assert wrong in asked
@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from map_layer import MapLayer  # noqa: E402
+from term_catalog import main_bbox  # noqa: E402
+
+
+def test_main_bbox_leaves_out_small_parts():
+    boxes = [(0.0, 0.0, 10.0, 10.0), (50.0, 50.0, 51.0, 51.0), (9.0, 9.0, 15.0, 12.0)]
+    assert main_bbox(boxes) == (0.0, 0.0, 15.0, 12.0)
+
+
+def test_main_bbox_of_a_feature_without_parts():
+    layer = MapLayer("polygons")
+    layer.add_feature("x", [])
+    assert "x" in layer
+    assert main_bbox([layer.part_bbox(part) for part in layer.term_parts("x")]) is None
@@ -0,0 +1,157 @@
+"""
+Map thumbnails of the learning sets shown in the menu.
+
+Rendered offline with `python thumbnails.py` by a process pool, one learning set per task, from the
+Low quality maps. Every PNG in THUMBNAIL_DIR is named by the hash of the learning set file and the
+map data version (the Low quality files), so only sets whose file or map data changed are rendered
+again and the menu finds a thumbnail with one hash, it never renders one. The region of a set is taken
+from the map layers, not from the term catalog (a build output that may be missing or outdated).
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+from frame_preparer import View, prepare_layer, scale_coords
+from map_layer import LAYER_FILES, LAYER_KEYS, QUALITIES, load_layer
+from term_catalog import main_bbox, union_bbox
+
+THUMBNAIL_DIR = "maps/thumbnails"
+THUMBNAIL_SIZE = (96, 60)
+THUMBNAIL_PADDING = 0.2  # part of the learning set region added around it
+RENDER_VERSION = 2  # bump when the look of the thumbnails changes
+
+data_version = None
+layers = None  # key -> [MapLayer per quality or None], loaded once per worker process
+
+
+def get_data_version():
+    """Hash of the Low quality map files the thumbnails are drawn from."""
+    global data_version
+    if data_version is None:
+        digest = hashlib.sha1(f"{RENDER_VERSION} {THUMBNAIL_SIZE}".encode())
+        for key in LAYER_KEYS:
+            path = f"maps/{QUALITIES[0]}/{LAYER_FILES[key]}.json"
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        data_version = digest.hexdigest()
+    return data_version
+
+
+def thumbnail_path(raw):
+    """Path of the thumbnail of a learning set file with content raw (bytes)."""
+    digest = hashlib.sha1(raw + get_data_version().encode()).hexdigest()
+    return os.path.join(THUMBNAIL_DIR, digest[:20] + ".png")
+
+
+def load_thumbnail(raw):
+    """The cached thumbnail of a learning set file or None if it was not rendered."""
+    path = thumbnail_path(raw)
+    if not os.path.exists(path):
+        return None
+    return pygame.image.load(path)
+
+
+def get_layers():
+    global layers
+    if layers is None:
+        layers = {}
+        for key in LAYER_KEYS:
+            layers[key] = []
+            for quality in QUALITIES:
+                path = f"maps/{quality}/{LAYER_FILES[key]}.json"
+                layers[key].append(load_layer(path, key) if os.path.exists(path) else None)
+    return layers
+
+
+def term_layer(key, name):
+    """The coarsest loaded layer holding a term, None if it is in none."""
+    return next((layer for layer in get_layers().get(key, []) if layer is not None and name in layer), None)
+
+
+def term_bbox(key, name):
+    """Bbox of the main parts of a term (see term_catalog.main_bbox), None if it is unknown."""
+    layer = term_layer(key, name)
+    if layer is None:
+        return None
+    return main_bbox([layer.part_bbox(part) for part in layer.term_parts(name)])
+
+
+def thumbnail_view(items):
+    """View fitting the region of the items (the whole world if it is unknown) into THUMBNAIL_SIZE."""
+    width, height = THUMBNAIL_SIZE
+    boxes = [bbox for key, names in items.items() for bbox in (term_bbox(key, name) for name in names) if bbox is not None]
+    bbox = union_bbox(boxes) if boxes else (-200, -200, 200, 200)
+    pad_x = max(bbox[2] - bbox[0], 1) * THUMBNAIL_PADDING
+    pad_y = max(bbox[3] - bbox[1], 1) * THUMBNAIL_PADDING
+    bbox = (bbox[0] - pad_x, bbox[1] - pad_y, bbox[2] + pad_x, bbox[3] + pad_y)
+    scale = min(width / (bbox[2] - bbox[0]), height / (bbox[3] - bbox[1]))
+    center_x, center_y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return View(0, scale, width / 2 - center_x * scale, height / 2 + center_y * scale, width, height)
+
+
+def render_thumbnail(items, path):
+    """Draw the Low quality map around the items with the items in red and save it as PNG to path."""
+    view = thumbnail_view(items)
+    surface = pygame.Surface(THUMBNAIL_SIZE)
+    surface.fill((100, 100, 255))
+    low = {key: qualities[0] for key, qualities in get_layers().items()}
+    for polygon, name in prepare_layer("polygons", low["polygons"], view):
+        pygame.draw.polygon(surface, (100, 155, 100), polygon)
+    for polygon, name in prepare_layer("blue_polygons", low["blue_polygons"], view):
+        pygame.draw.polygon(surface, (60, 60, 220), polygon)
+
+    for key, names in items.items():
+        for name in names:
+            layer = term_layer(key, name)
+            if layer is None:
+                continue
+            if key == "points":
+                x, y = layer.point(name)
+                pygame.draw.circle(surface, (200, 40, 40), scale_coords((x, y), view)[0], 2)
+                continue
+            for part in layer.term_parts(name):
+                points = scale_coords(layer.part_coords(part), view)
+                if key == "lines" and len(points) > 1:
+                    pygame.draw.lines(surface, (200, 40, 40), False, points, 2)
+                elif len(points) > 2:
+                    pygame.draw.polygon(surface, (200, 40, 40), points)
+
+    pygame.draw.rect(surface, (0, 0, 0), surface.get_rect(), 1)
+    pygame.image.save(surface, path)
+    return path
+
+
+def render_job(job):
+    set_path, path = job
+    with open(set_path, "r") as f:
+        return render_thumbnail(json.load(f)["items"], path)
+
+
+def build_thumbnails(processes=None):
+    """Render the missing thumbnails of maps/learning_sets in a process pool, remove outdated ones."""
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    jobs = []
+    wanted = set()
+    for file_name in sorted(os.listdir("maps/learning_sets")):
+        set_path = f"maps/learning_sets/{file_name}"
+        with open(set_path, "rb") as f:
+            path = thumbnail_path(f.read())
+        wanted.add(os.path.basename(path))
+        if not os.path.exists(path):
+            jobs.append((set_path, path))
+    for file_name in os.listdir(THUMBNAIL_DIR):
+        if file_name.endswith(".png") and file_name not in wanted:
+            os.remove(os.path.join(THUMBNAIL_DIR, file_name))
+    if jobs:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            list(pool.map(render_job, jobs))
+    return len(jobs), len(wanted)
+
+
+if __name__ == "__main__":
+    rendered, total = build_thumbnails()
+    print(f"rendered {rendered} of {total} thumbnails into {THUMBNAIL_DIR}")
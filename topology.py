@@ -0,0 +1,121 @@
+"""
+Shared-border topology of the countries layer (like TopoJSON).
+
+Neighbouring countries store their common border twice in polygons.json and the map drew
+it twice, once with every neighbour's outline. Here every border is cut into arcs, each arc
+is stored once and the rings of a country are lists of arc references:
+i is arcs[i], ~i (-i - 1) is arcs[i] reversed.
+
+Build with `python topology.py` after maps/<quality>/polygons.json changes, it writes
+maps/<quality>/polygons_topo.json which load_layer then uses instead of polygons.json.
+"""
+import json
+import os
+
+QUALITIES = ["Low_quality", "Medium_quality", "High_quality"]  # same as map_layer.QUALITIES
+
+
+def edge_key(a, b):
+    return (a, b) if a <= b else (b, a)
+
+
+def split_ring(ring, edge_owners):
+    """
+    Cut a closed ring (list of (x, y), first == last) into runs of edges shared by the same rings.
+    Returns list of point lists, consecutive runs share their end points.
+    """
+    edges = [edge_key(ring[i], ring[i + 1]) for i in range(len(ring) - 1)]
+    owners = [edge_owners[edge] for edge in edges]
+    breaks = [i for i in range(len(edges)) if owners[i] != owners[i - 1]]
+    if not breaks:
+        # border with nobody (island) or the whole ring is shared, start at the smallest vertex
+        # so the same ring walked by a neighbour gives the same arc
+        points = ring[:-1]
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+        return [points + [points[0]]]
+
+    runs = []
+    for i, start in enumerate(breaks):
+        end = breaks[(i + 1) % len(breaks)]
+        if end <= start:
+            indices = list(range(start, len(edges))) + list(range(0, end))
+        else:
+            indices = list(range(start, end))
+        runs.append([ring[j] for j in indices] + [ring[indices[-1] + 1]])
+    return runs
+
+
+def build_topology(data):
+    """
+    Convert {name: {"geometry": [{"points": [[x, y], ...]}, ...]}} (rings closed)
+    to {"arcs": [[[x, y], ...], ...], "objects": {name: [[arc refs], ...]}}.
+    """
+    rings = []  # (name, ring)
+    for name, value in data.items():
+        for part in value["geometry"]:
+            ring = [tuple(p) for p in part["points"]]
+            if len(ring) < 3:
+                continue
+            if ring[0] != ring[-1]:
+                ring.append(ring[0])
+            rings.append((name, ring))
+
+    edge_owners = {}
+    for ring_id, (name, ring) in enumerate(rings):
+        for i in range(len(ring) - 1):
+            edge_owners.setdefault(edge_key(ring[i], ring[i + 1]), set()).add(ring_id)
+    edge_owners = {edge: frozenset(owners) for edge, owners in edge_owners.items()}
+
+    arcs = []
+    arc_index = {}  # tuple of points -> arc id
+    objects = {}
+    for name, ring in rings:
+        refs = []
+        for run in split_ring(ring, edge_owners):
+            run = tuple(run)
+            if run in arc_index:
+                refs.append(arc_index[run])
+            elif run[::-1] in arc_index:
+                refs.append(~arc_index[run[::-1]])
+            else:
+                arc_index[run] = len(arcs)
+                refs.append(len(arcs))
+                arcs.append([list(p) for p in run])
+        objects.setdefault(name, []).append(refs)
+
+    for name in data:
+        objects.setdefault(name, [])  # keep features without usable rings
+    return {"arcs": arcs, "objects": objects}
+
+
+def ring_from_arcs(arcs, refs):
+    """Rebuild a closed ring (list of [x, y]) from arc references."""
+    ring = []
+    for ref in refs:
+        arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+        ring.extend(arc if not ring else arc[1:])
+    return ring
+
+
+def build_all():
+    for quality in QUALITIES:
+        path = f"maps/{quality}/polygons.json"
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            data = json.load(f)
+        topology = build_topology(data)
+        out_path = f"maps/{quality}/polygons_topo.json"
+        with open(out_path, "w") as f:
+            json.dump(topology, f, separators=(",", ":"))
+
+        ring_vertices = sum(len(part["points"]) for value in data.values() for part in value["geometry"])
+        arc_vertices = sum(len(arc) for arc in topology["arcs"])
+        compact = len(json.dumps(data, separators=(",", ":")))
+        print(quality, len(topology["arcs"]), "arcs,", ring_vertices, "->", arc_vertices, "vertices,",
+              compact, "->", os.path.getsize(out_path), "bytes (compact JSON)")
+
+
+if __name__ == "__main__":
+    build_all()